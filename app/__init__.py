@@ -11,9 +11,10 @@ def create_app():
     instance_relative_config=True,
 )
 
-    app.config.from_mapping(
-        DATABASE=os.path.join(app.instance_path, "social_listener.db"),
-    )
+    from .repo.db import get_db_path
+
+    # Honours SOCIAL_LISTENER_DB, so the UI can open a replay database.
+    app.config.from_mapping(DATABASE=get_db_path())
 
     from .config import load_env_config
 
@@ -22,8 +23,11 @@ def create_app():
     os.makedirs(app.instance_path, exist_ok=True)
     from .repo.migrate import init_db_if_missing
 
-    if not os.path.exists(app.config["DATABASE"]):
-        init_db_if_missing(app.config["DATABASE"])
+    init_db_if_missing(app.config["DATABASE"])
+
+    from .repo.db import close_connection
+
+    app.teardown_appcontext(close_connection)
 
     from .routes import bp as routes_bp
 
@@ -0,0 +1,180 @@
+import threading
+import time
+
+# Reddit's OAuth quota for script apps.
+REDDIT_REQUESTS_PER_MINUTE = 100
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate_per_minute=REDDIT_REQUESTS_PER_MINUTE,
+        capacity=None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = float(self.capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.waited_seconds = 0.0
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_second)
+            self._updated_at = now
+
+    def set_rate(self, rate_per_minute, capacity=None):
+        with self._lock:
+            self._refill()
+            self.rate_per_second = max(rate_per_minute, 1e-3) / 60.0
+            if capacity is not None:
+                self.capacity = max(1, capacity)
+                self.tokens = min(self.tokens, self.capacity)
+
+    def delay(self, tokens=1):
+        with self._lock:
+            self._refill()
+            return max(0.0, (tokens - self.tokens) / self.rate_per_second)
+
+    def acquire(self, tokens=1):
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    self.waited_seconds += waited
+                    return waited
+                delay = (tokens - self.tokens) / self.rate_per_second
+            self.sleep(delay)
+            waited += delay
+
+
+class RateLimitExhausted(Exception):
+    pass
+
+
+def is_rate_limited(exc):
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None) == 429
+
+
+class RateGovernor:
+    # Paces requests from the quota Reddit reports on every response
+    # (reddit.auth.limits: remaining, used, reset_timestamp). The remaining
+    # quota is spread over the rest of the reset window, concurrency shrinks
+    # as headroom does. Once the run has spent max_throttle_seconds paused
+    # on an exhausted quota (a 429, or remaining down to the reserve) every
+    # acquire raises RateLimitExhausted so the caller can stop with what it
+    # has instead of failing. Ordinary pacing waits are only reported.
+    def __init__(
+        self,
+        limits=None,
+        rate_per_minute=REDDIT_REQUESTS_PER_MINUTE,
+        max_concurrency=4,
+        reserve=5,
+        max_throttle_seconds=300,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        wall_clock=time.time,
+    ):
+        self.bucket = TokenBucket(rate_per_minute, clock=clock, sleep=sleep)
+        self.base_rate_per_minute = rate_per_minute
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.reserve = reserve
+        self.max_throttle_seconds = max_throttle_seconds
+        self.exhausted = False
+        self._limits = limits
+        self._sleep = sleep
+        self._wall_clock = wall_clock
+        self._paused_until = None
+        self._pause_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def throttle_seconds(self):
+        return self.bucket.waited_seconds + self._pause_seconds
+
+    def observe(self, limits):
+        remaining = limits.get("remaining") if limits else None
+        reset_at = limits.get("reset_timestamp") if limits else None
+        if remaining is None or reset_at is None:
+            return
+        window = max(reset_at - self._wall_clock(), 1.0)
+        budget = max(remaining - self.reserve, 0)
+        rate = min(self.base_rate_per_minute, budget / window * 60)
+        with self._lock:
+            if budget <= 0:
+                self._paused_until = reset_at
+            self.concurrency = max(
+                1, round(self.max_concurrency * rate / self.base_rate_per_minute)
+            )
+        # Never let a burst spend more than the quota that is left.
+        self.bucket.set_rate(
+            rate if budget > 0 else self.base_rate_per_minute,
+            capacity=min(self.base_rate_per_minute, budget) if budget > 0 else None,
+        )
+
+    def backoff(self, exc=None):
+        # A 429 means our view of the quota was stale; sit out the window.
+        retry_after = None
+        response = getattr(exc, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        try:
+            retry_after = float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+        if retry_after is None and self._limits is not None:
+            reset_at = (self._limits() or {}).get("reset_timestamp")
+            if reset_at is not None:
+                retry_after = reset_at - self._wall_clock()
+        with self._lock:
+            self.concurrency = 1
+            self._paused_until = self._wall_clock() + max(retry_after or 60.0, 1.0)
+        self._wait_for_pause()
+
+    def _wait_for_pause(self):
+        with self._lock:
+            if self.exhausted:
+                raise RateLimitExhausted("Reddit quota exhausted for this run.")
+            delay = 0.0
+            if self._paused_until is not None:
+                delay = self._paused_until - self._wall_clock()
+            if delay <= 0:
+                self._paused_until = None
+                return
+            if self._pause_seconds + delay > self.max_throttle_seconds:
+                self.exhausted = True
+                raise RateLimitExhausted(
+                    f"Reddit quota exhausted; reset in {delay:.0f}s."
+                )
+            self._pause_seconds += delay
+        self._sleep(delay)
+
+    def acquire(self, tokens=1):
+        if self._limits is not None:
+            self.observe(self._limits())
+        self._wait_for_pause()
+        return self.bucket.acquire(tokens)
+
+
+def call_with_backoff(rate_limiter, fn, *args, retries=2):
+    attempt = 0
+    while True:
+        try:
+            return fn(*args)
+        except RateLimitExhausted:
+            raise
+        except Exception as exc:
+            backoff = getattr(rate_limiter, "backoff", None)
+            if backoff is None or not is_rate_limited(exc) or attempt >= retries:
+                raise
+            attempt += 1
+            backoff(exc)
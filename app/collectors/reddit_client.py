@@ -1,11 +1,14 @@
 import praw
 
 
-def build_reddit_client(config):
+def build_reddit_client(config, **kwargs):
+    # kwargs pass through to praw.Reddit, e.g. requestor_kwargs={"session": ...}
+    # to run the collectors against a local fake transport.
     return praw.Reddit(
         client_id=config.get("REDDIT_CLIENT_ID"),
         client_secret=config.get("REDDIT_CLIENT_SECRET"),
         user_agent=config.get("REDDIT_USER_AGENT"),
         username=config.get("REDDIT_USERNAME"),
         password=config.get("REDDIT_PASSWORD"),
+        **kwargs,
     )
@@ -1,11 +1,270 @@
-def fetch_threads(reddit, subreddits, limit):
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from .rate_limit import call_with_backoff
+
+# Reddit listings return at most 100 items per request, and stop at ~1000.
+LISTING_PAGE_SIZE = 100
+LISTING_MAX_ITEMS = 1000
+
+
+class FetchTimer:
+    # Wall-clock time with at least one fetch in flight, so overlapping
+    # fetches on worker threads are counted once.
+    def __init__(self, clock=time.monotonic):
+        self.seconds = 0.0
+        self._clock = clock
+        self._active = 0
+        self._since = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            if self._active == 0:
+                self._since = self._clock()
+            self._active += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                self.seconds += self._clock() - self._since
+        return False
+
+
+def _fetch_subreddit(reddit, subreddit_name, limit, rate_limiter=None, cursor=None):
+    known_fullname = cursor.get("newest_fullname") if cursor else None
+    known_created_utc = cursor.get("newest_created_utc") if cursor else None
+    fetch_limit = limit
+    if cursor and cursor.get("fetch_limit"):
+        fetch_limit = max(limit, cursor["fetch_limit"])
+
+    subreddit = reddit.subreddit(subreddit_name)
     submissions = []
-    for subreddit_name in subreddits:
-        subreddit = reddit.subreddit(subreddit_name)
-        submissions.extend(list(subreddit.new(limit=limit)))
-    return submissions
+    reached_known = False
+    params = None
+    while True:
+        # Listings are lazy; charge the bucket once per page actually requested.
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        page_count = 0
+        for submission in subreddit.new(limit=fetch_limit, params=params):
+            if (
+                rate_limiter is not None
+                and page_count
+                and page_count % LISTING_PAGE_SIZE == 0
+            ):
+                rate_limiter.acquire()
+            page_count += 1
+            if known_fullname and (
+                submission.fullname == known_fullname
+                or (
+                    known_created_utc is not None
+                    and submission.created_utc < known_created_utc
+                )
+            ):
+                reached_known = True
+                break
+            submissions.append(submission)
+
+        # Without a cursor only the base window is taken. With one, keep paging
+        # (with a growing window) until the known newest post turns up.
+        if (
+            reached_known
+            or known_fullname is None
+            or page_count < fetch_limit
+            or len(submissions) >= LISTING_MAX_ITEMS
+        ):
+            break
+        params = {"after": submissions[-1].fullname}
+        fetch_limit = min(LISTING_MAX_ITEMS - len(submissions), fetch_limit * 2)
+
+    next_cursor = {
+        "newest_fullname": known_fullname,
+        "newest_created_utc": known_created_utc,
+        "fetch_limit": min(LISTING_MAX_ITEMS, max(limit, len(submissions) * 2)),
+    }
+    if submissions:
+        next_cursor["newest_fullname"] = submissions[0].fullname
+        next_cursor["newest_created_utc"] = int(submissions[0].created_utc)
+    return submissions, next_cursor
+
+
+def _in_flight_limit(rate_limiter, limit):
+    # A governor lowers its concurrency as the quota runs down.
+    concurrency = getattr(rate_limiter, "concurrency", None)
+    if concurrency is None:
+        return limit
+    return max(1, min(limit, concurrency))
+
+
+def _drain(items):
+    # Hand items out one at a time and drop our reference to each, so a
+    # submission's comment forest can be freed once the caller is done with it.
+    queue = deque(items)
+    items.clear()
+    while queue:
+        yield queue.popleft()
+
+
+def fetch_subreddit_batches(
+    reddit,
+    subreddits,
+    limit,
+    max_workers=4,
+    rate_limiter=None,
+    cursors=None,
+    max_buffered=None,
+    timer=None,
+):
+    subreddits = list(subreddits)
+    cursors = cursors or {}
+    timer = timer or nullcontext()
 
+    def fetch(subreddit_name):
+        with timer:
+            return call_with_backoff(
+                rate_limiter,
+                _fetch_subreddit,
+                reddit,
+                subreddit_name,
+                limit,
+                rate_limiter,
+                cursors.get(subreddit_name),
+            )
 
-def fetch_comments(submission):
+    if max_workers <= 1 or len(subreddits) <= 1:
+        for subreddit_name in subreddits:
+            batch, cursor = fetch(subreddit_name)
+            yield subreddit_name, _drain(batch), cursor
+        return
+
+    # At most max_buffered subreddits are fetched or waiting to be consumed,
+    # so memory stays flat however many subreddits are configured. Batches
+    # come back in config order, so when the quota runs out the subreddits
+    # listed first are the ones that got written.
+    if max_buffered is None:
+        max_buffered = max_workers * 2
+    remaining = deque(subreddits)
+    executor = ThreadPoolExecutor(
+        max_workers=min(max_workers, len(subreddits)),
+        thread_name_prefix="reddit-fetch",
+    )
+    try:
+        pending = deque()
+
+        def submit_next():
+            while remaining and len(pending) < _in_flight_limit(
+                rate_limiter, max_buffered
+            ):
+                subreddit_name = remaining.popleft()
+                pending.append((subreddit_name, executor.submit(fetch, subreddit_name)))
+
+        submit_next()
+        while pending:
+            subreddit_name, future = pending.popleft()
+            batch, cursor = future.result()
+            submit_next()
+            yield subreddit_name, _drain(batch), cursor
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_subreddit_history(
+    reddit, subreddit_name, since_utc, after=None, rate_limiter=None, timer=None
+):
+    # Walks /new backwards one page at a time, from `after` (a fullname) if
+    # given, until posts are older than since_utc or the listing runs out
+    # (Reddit stops serving /new after roughly LISTING_MAX_ITEMS posts).
+    subreddit = reddit.subreddit(subreddit_name)
+    timer = timer or nullcontext()
+    while True:
+        params = {"after": after} if after else None
+        with timer:
+            page = call_with_backoff(
+                rate_limiter,
+                lambda: _fetch_listing_page(subreddit, params, rate_limiter),
+            )
+        page_size = len(page)
+        for submission in _drain(page):
+            if submission.created_utc < since_utc:
+                return
+            after = submission.fullname
+            yield submission
+        if page_size < LISTING_PAGE_SIZE:
+            return
+
+
+def _fetch_listing_page(subreddit, params, rate_limiter):
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    return list(subreddit.new(limit=LISTING_PAGE_SIZE, params=params))
+
+
+def fetch_known_submissions(
+    reddit, source_thread_ids, rate_limiter=None, timer=None
+):
+    fullnames = [f"t3_{thread_id}" for thread_id in source_thread_ids]
+    timer = timer or nullcontext()
+    for start in range(0, len(fullnames), LISTING_PAGE_SIZE):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        with timer:
+            batch = call_with_backoff(
+                rate_limiter,
+                lambda: list(
+                    reddit.info(fullnames=fullnames[start : start + LISTING_PAGE_SIZE])
+                ),
+            )
+        yield from _drain(batch)
+
+
+def fetch_comments(submission, rate_limiter=None):
+    if rate_limiter is not None:
+        rate_limiter.acquire()
     submission.comments.replace_more(limit=0)
-    return list(submission.comments.list())
+    yield from submission.comments.list()
+
+
+def prefetch_comment_forests(
+    items, rate_limiter=None, max_workers=4, lookahead=None, timer=None
+):
+    # items yields (submission, wanted). Forests for the next `lookahead`
+    # wanted submissions are fetched on worker threads while the caller
+    # handles the current one; results come back in input order, with None
+    # for submissions whose comments were not wanted.
+    timer = timer or nullcontext()
+    if lookahead is None:
+        lookahead = max_workers * 2
+
+    def fetch(submission):
+        with timer:
+            return call_with_backoff(
+                rate_limiter, lambda: list(fetch_comments(submission, rate_limiter))
+            )
+
+    if max_workers <= 1:
+        for submission, wanted in items:
+            yield submission, fetch(submission) if wanted else None
+        return
+
+    executor = ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="reddit-comments"
+    )
+    try:
+        pending = deque()
+        for submission, wanted in items:
+            future = executor.submit(fetch, submission) if wanted else None
+            pending.append((submission, future))
+            while len(pending) > _in_flight_limit(rate_limiter, lookahead):
+                submission, future = pending.popleft()
+                yield submission, future.result() if future else None
+        while pending:
+            submission, future = pending.popleft()
+            yield submission, future.result() if future else None
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,307 @@
+import gzip
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+# Recordings are gzip'd JSONL: one "submission" line per listing item seen and
+# one "comments" line per comment forest fetched, each with the latency the
+# live call took so a replay can reproduce the timing.
+RECORD_VERSION = 1
+# Clones are named "<id>-<n>"; Reddit's base36 ids never contain a hyphen.
+CLONE_SEPARATOR = "-"
+
+
+def _author_name(item):
+    author = getattr(item, "author", None)
+    if author is None:
+        return None
+    return getattr(author, "name", None) or str(author)
+
+
+def _submission_record(submission, latency):
+    return {
+        "kind": "submission",
+        "version": RECORD_VERSION,
+        "latency": latency,
+        "id": submission.id,
+        "subreddit": str(submission.subreddit),
+        "url": submission.url,
+        "title": submission.title,
+        "selftext": submission.selftext,
+        "author": _author_name(submission),
+        "created_utc": submission.created_utc,
+        "score": getattr(submission, "score", None),
+        "num_comments": getattr(submission, "num_comments", None),
+        "edited": getattr(submission, "edited", False),
+    }
+
+
+def _comment_record(comment):
+    return {
+        "id": comment.id,
+        "parent_id": comment.parent_id,
+        "author": _author_name(comment),
+        "body": comment.body,
+        "created_utc": comment.created_utc,
+        "depth": getattr(comment, "depth", None),
+        "permalink": getattr(comment, "permalink", None),
+        "edited": getattr(comment, "edited", False),
+    }
+
+
+class _Recorder:
+    def __init__(self, path):
+        self._handle = gzip.open(path, "wt", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock:
+            self._handle.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._handle.close()
+
+
+class _RecordingComments:
+    def __init__(self, comments, submission_id, recorder, started):
+        self._comments = comments
+        self._submission_id = submission_id
+        self._recorder = recorder
+        self._started = started
+
+    def replace_more(self, limit=0):
+        return self._comments.replace_more(limit=limit)
+
+    def list(self):
+        comments = self._comments.list()
+        self._recorder.write(
+            {
+                "kind": "comments",
+                "version": RECORD_VERSION,
+                "latency": time.perf_counter() - self._started,
+                "submission_id": self._submission_id,
+                "comments": [_comment_record(comment) for comment in comments],
+            }
+        )
+        return comments
+
+
+class _RecordingSubmission:
+    def __init__(self, submission, recorder):
+        self._submission = submission
+        self._recorder = recorder
+        self._comments = None
+
+    def __getattr__(self, name):
+        return getattr(self._submission, name)
+
+    @property
+    def comments(self):
+        # praw loads the forest on first access, so time from there.
+        if self._comments is None:
+            started = time.perf_counter()
+            self._comments = _RecordingComments(
+                self._submission.comments,
+                self._submission.id,
+                self._recorder,
+                started,
+            )
+        return self._comments
+
+
+def _record_listing(items, recorder):
+    started = time.perf_counter()
+    for submission in items:
+        recorder.write(_submission_record(submission, time.perf_counter() - started))
+        yield _RecordingSubmission(submission, recorder)
+        started = time.perf_counter()
+
+
+class _RecordingSubreddit:
+    def __init__(self, subreddit, recorder):
+        self._subreddit = subreddit
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._subreddit, name)
+
+    def new(self, **kwargs):
+        return _record_listing(self._subreddit.new(**kwargs), self._recorder)
+
+
+class RecordingReddit:
+    # Wraps a praw.Reddit client and writes everything the collectors read.
+    def __init__(self, reddit, path):
+        self._reddit = reddit
+        self._recorder = _Recorder(path)
+
+    def __getattr__(self, name):
+        return getattr(self._reddit, name)
+
+    def subreddit(self, name):
+        return _RecordingSubreddit(self._reddit.subreddit(name), self._recorder)
+
+    def info(self, fullnames=None):
+        return _record_listing(self._reddit.info(fullnames=fullnames), self._recorder)
+
+    def close(self):
+        self._recorder.close()
+
+
+def read_recording(path):
+    with gzip.open(path, "rt", encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _clone_id(source_id, copy_index):
+    if copy_index == 0:
+        return source_id
+    return f"{source_id}{CLONE_SEPARATOR}{copy_index}"
+
+
+def _clone_parent_id(parent_id, copy_index):
+    if not parent_id or copy_index == 0:
+        return parent_id
+    prefix, _, source_id = parent_id.partition("_")
+    return f"{prefix}_{_clone_id(source_id, copy_index)}"
+
+
+def _author(name):
+    return SimpleNamespace(name=name) if name else None
+
+
+class _ReplayComments:
+    def __init__(self, owner, submission_id):
+        self._owner = owner
+        self._submission_id = submission_id
+
+    def replace_more(self, limit=0):
+        return []
+
+    def list(self):
+        return self._owner.comments_for(self._submission_id)
+
+
+class ReplayReddit:
+    # Serves a recording through the praw calls the collectors make. With
+    # scale > 1 every submission and comment is cloned under a new ID; speedup
+    # divides the recorded latencies (0 replays as fast as possible).
+    def __init__(self, path, speedup=1.0, scale=1, sleep=time.sleep):
+        self.speedup = speedup
+        self.scale = max(1, int(scale))
+        self.auth = SimpleNamespace(limits={})
+        self._sleep = sleep
+        self._submissions = {}
+        self._comments = {}
+        self._by_subreddit = {}
+
+        for record in read_recording(path):
+            if record["kind"] == "submission":
+                self._submissions[record["id"]] = record
+            elif record["kind"] == "comments":
+                self._comments[record["submission_id"]] = record
+
+        for record in self._submissions.values():
+            self._by_subreddit.setdefault(record["subreddit"].lower(), []).append(
+                record
+            )
+        for records in self._by_subreddit.values():
+            records.sort(key=lambda record: (-record["created_utc"], record["id"]))
+
+    def _wait(self, latency):
+        if self.speedup and latency:
+            self._sleep(latency / self.speedup)
+
+    def _split_id(self, submission_id):
+        source_id, marker, copy_index = submission_id.rpartition(CLONE_SEPARATOR)
+        if marker and copy_index.isdigit() and source_id in self._submissions:
+            return source_id, int(copy_index)
+        return submission_id, 0
+
+    def _submission(self, record, copy_index):
+        submission_id = _clone_id(record["id"], copy_index)
+        return SimpleNamespace(
+            id=submission_id,
+            name=f"t3_{submission_id}",
+            fullname=f"t3_{submission_id}",
+            subreddit=record["subreddit"],
+            url=record["url"],
+            title=record["title"],
+            selftext=record["selftext"],
+            author=_author(record["author"]),
+            created_utc=record["created_utc"],
+            score=record["score"],
+            num_comments=record["num_comments"],
+            edited=record["edited"],
+            comments=_ReplayComments(self, submission_id),
+        )
+
+    def _listing(self, records):
+        return [
+            (record, copy_index)
+            for record in records
+            for copy_index in range(self.scale)
+        ]
+
+    def subreddit(self, name):
+        return _ReplaySubreddit(self, self._by_subreddit.get(name.lower(), []))
+
+    def info(self, fullnames=None):
+        for fullname in fullnames or []:
+            source_id, copy_index = self._split_id(fullname.partition("_")[2])
+            record = self._submissions.get(source_id)
+            if record is None or copy_index >= self.scale:
+                continue
+            self._wait(record.get("latency"))
+            yield self._submission(record, copy_index)
+
+    def comments_for(self, submission_id):
+        source_id, copy_index = self._split_id(submission_id)
+        record = self._comments.get(source_id)
+        if record is None:
+            return []
+        self._wait(record.get("latency"))
+        comments = []
+        for comment in record["comments"]:
+            comments.append(
+                SimpleNamespace(
+                    id=_clone_id(comment["id"], copy_index),
+                    parent_id=_clone_parent_id(comment["parent_id"], copy_index),
+                    author=_author(comment["author"]),
+                    body=comment["body"],
+                    created_utc=comment["created_utc"],
+                    depth=comment["depth"],
+                    permalink=comment["permalink"],
+                    edited=comment["edited"],
+                )
+            )
+        return comments
+
+    def close(self):
+        pass
+
+
+class _ReplaySubreddit:
+    def __init__(self, owner, records):
+        self._owner = owner
+        self._items = owner._listing(records)
+
+    def new(self, limit=None, params=None):
+        start = 0
+        after = (params or {}).get("after")
+        if after:
+            source_id, copy_index = self._owner._split_id(after.partition("_")[2])
+            for index, (record, item_copy) in enumerate(self._items):
+                if record["id"] == source_id and item_copy == copy_index:
+                    start = index + 1
+                    break
+        end = len(self._items) if limit is None else start + limit
+        for record, copy_index in self._items[start:end]:
+            self._owner._wait(record.get("latency"))
+            yield self._owner._submission(record, copy_index)
@@ -1,4 +1,11 @@
+import hashlib
 import json
+import threading
+
+KEYWORD_CONFIG_KEYS = ("keywords_include", "keywords_intent", "keywords_negative")
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
 
 
 def get_config_value(conn, key):
@@ -56,7 +63,47 @@ def get_config_dict(conn, key, default=None):
     return default
 
 
+def _normalize_terms(terms):
+    if not isinstance(terms, list):
+        return []
+    normalized = []
+    for term in terms:
+        term = str(term).strip()
+        # Same as rules_engine: regex terms keep their case.
+        if term[:3].lower() == "re:":
+            term = "re:" + term[3:].strip()
+        else:
+            term = term.lower()
+        if term and term not in normalized:
+            normalized.append(term)
+    return normalized
+
+
+def _record_term_changes(conn, key, value):
+    old_terms = _normalize_terms(get_config_list(conn, key, []))
+    new_terms = _normalize_terms(value)
+    changes = [(key, term, "added") for term in new_terms if term not in old_terms]
+    changes.extend(
+        (key, term, "removed") for term in old_terms if term not in new_terms
+    )
+    if not changes:
+        return
+    conn.executemany(
+        """
+        INSERT INTO config_term_changes (
+            config_key,
+            term,
+            change_type,
+            created_at_utc
+        ) VALUES (?, ?, ?, strftime('%s','now'))
+        """,
+        changes,
+    )
+
+
 def upsert_config_value(conn, key, value):
+    if key in KEYWORD_CONFIG_KEYS:
+        _record_term_changes(conn, key, value)
     payload = json.dumps(value)
     conn.execute(
         """
@@ -68,3 +115,165 @@ def upsert_config_value(conn, key, value):
         """,
         (key, payload),
     )
+
+
+def list_pending_term_changes(conn):
+    return conn.execute(
+        """
+        SELECT *
+        FROM config_term_changes
+        WHERE applied_at_utc IS NULL
+        ORDER BY change_pk ASC
+        """
+    ).fetchall()
+
+
+def mark_term_changes_applied(conn, max_change_pk, now_utc):
+    conn.execute(
+        """
+        UPDATE config_term_changes
+        SET applied_at_utc = ?
+        WHERE applied_at_utc IS NULL AND change_pk <= ?
+        """,
+        (now_utc, max_change_pk),
+    )
+
+
+def _hash_raw_values(raw_values, keys):
+    digest = hashlib.sha256()
+    for key in sorted(set(keys)):
+        if key not in raw_values:
+            continue
+        digest.update(key.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update((raw_values[key] or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ConfigSnapshot:
+    # The whole config table as of one version, parsed once. Values are shared
+    # between callers, so treat them as read-only.
+    def __init__(self, version, raw_values):
+        self.version = version
+        self._raw = raw_values
+        self._parsed = {
+            key: parse_config_json(raw_value) for key, raw_value in raw_values.items()
+        }
+        self._derived = {}
+
+    def items(self):
+        return sorted(self._parsed.items())
+
+    def get(self, key, default=None):
+        value = self._parsed.get(key)
+        return default if value is None else value
+
+    def get_list(self, key, default=None):
+        value = self._parsed.get(key)
+        if isinstance(value, list):
+            return value
+        return [] if default is None else default
+
+    def get_bool(self, key, default=False):
+        value = self._parsed.get(key)
+        return value if isinstance(value, bool) else default
+
+    def get_int(self, key, default=0):
+        value = self._parsed.get(key)
+        return value if isinstance(value, int) else default
+
+    def get_dict(self, key, default=None):
+        value = self._parsed.get(key)
+        if isinstance(value, dict):
+            return value
+        return {} if default is None else default
+
+    def hash_values(self, keys):
+        keys = tuple(keys)
+        cache_key = ("hash", keys)
+        if cache_key not in self._derived:
+            self._derived[cache_key] = _hash_raw_values(self._raw, keys)
+        return self._derived[cache_key]
+
+    def rule_config(self):
+        if "rule_config" not in self._derived:
+            self._derived["rule_config"] = {
+                "keywords_include": self.get_list("keywords_include", []),
+                "keywords_intent": self.get_list("keywords_intent", []),
+                "keywords_negative": self.get_list("keywords_negative", []),
+                "include_unknown_location": self.get_bool(
+                    "include_unknown_location", True
+                ),
+                "active_window_days": self.get_int("active_window_days", 5),
+                "geo_service_area": self.get_list("geo_service_area", []),
+                "subreddit_geo_map": self.get_dict("subreddit_geo_map", {}),
+                "geo_out_of_area": self.get_list("geo_out_of_area", []),
+            }
+        return self._derived["rule_config"]
+
+    def genai_config(self):
+        if "genai_config" not in self._derived:
+            self._derived["genai_config"] = {
+                "max_genai_evals_per_thread": self.get_int(
+                    "max_genai_evals_per_thread", 5
+                ),
+                "genai_cooldown_minutes": self.get_int("genai_cooldown_minutes", 120),
+                "delta_min_new_comments": self.get_int("delta_min_new_comments", 1),
+                "max_delta_comments_sent": self.get_int("max_delta_comments_sent", 25),
+                "business_context": self.get_dict(
+                    "business_context",
+                    {
+                        "service": "local service",
+                        "service_area": "unspecified",
+                        "tone": "helpful",
+                    },
+                ),
+            }
+        return self._derived["genai_config"]
+
+
+def get_config_version(conn):
+    # Bumped by triggers on every insert, update or delete in config.
+    row = conn.execute("SELECT version FROM config_version").fetchone()
+    return row["version"] if row else 0
+
+
+def load_config_snapshot(conn):
+    # Read the version first: a write that lands in between leaves the
+    # snapshot newer than its version, and the next check just reloads it.
+    version = get_config_version(conn)
+    rows = conn.execute("SELECT config_key, config_value FROM config").fetchall()
+    return ConfigSnapshot(
+        version, {row["config_key"]: row["config_value"] for row in rows}
+    )
+
+
+def get_config_snapshot(conn):
+    # One cached snapshot per database file, reloaded only when the config
+    # version moves, so each check costs a single-row read.
+    if conn.in_transaction:
+        # Uncommitted config writes may still roll back; don't cache them.
+        return load_config_snapshot(conn)
+    db_file = conn.execute("PRAGMA database_list").fetchone()["file"]
+    version = get_config_version(conn)
+    with _snapshots_lock:
+        snapshot = _snapshots.get(db_file)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    snapshot = load_config_snapshot(conn)
+    with _snapshots_lock:
+        _snapshots[db_file] = snapshot
+    return snapshot
+
+
+def hash_config_values(conn, keys):
+    return get_config_snapshot(conn).hash_values(keys)
+
+
+def get_rule_config(conn):
+    return get_config_snapshot(conn).rule_config()
+
+
+def get_genai_config(conn):
+    return get_config_snapshot(conn).genai_config()
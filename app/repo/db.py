@@ -1,16 +1,111 @@
 import os
 import sqlite3
+import threading
+
+try:
+    from flask import current_app, g, has_app_context
+except ImportError:  # scripts can run without Flask installed
+    current_app = g = None
+
+    def has_app_context():
+        return False
+
+
+# WAL lets the UI read while ingest writes; NORMAL sync is durable enough
+# under WAL and avoids an fsync per commit.
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("foreign_keys", "ON"),
+    ("busy_timeout", 5000),
+    ("temp_store", "MEMORY"),
+    ("cache_size", -64000),
+    ("mmap_size", 268435456),
+)
+
+# Upserts and deletes use RETURNING, added in SQLite 3.35.
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+_local = threading.local()
+_fts_trigram = None
 
 
 def get_db_path():
+    # Lets offline replays and benchmarks run against a scratch database.
+    override = os.getenv("SOCIAL_LISTENER_DB")
+    if override:
+        return os.path.abspath(override)
     repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
     return os.path.join(repo_root, "instance", "social_listener.db")
 
 
+def get_cache_dir(name):
+    return os.path.join(os.path.dirname(get_db_path()), "cache", name)
+
+
 def connect(db_path=None):
     if db_path is None:
         db_path = get_db_path()
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON;")
+    for name, value in PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value};")
     return conn
+
+
+def get_connection(db_path=None):
+    # One connection per Flask request (on g), otherwise one per thread.
+    if has_app_context():
+        if "db" not in g:
+            g.db = connect(db_path or current_app.config.get("DATABASE"))
+        return g.db
+
+    db_path = db_path or get_db_path()
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = connections[db_path] = connect(db_path)
+    return conn
+
+
+def close_connection(exc=None):
+    if has_app_context():
+        conn = g.pop("db", None)
+        if conn is not None:
+            conn.close()
+        return
+
+    connections = getattr(_local, "connections", None) or {}
+    while connections:
+        _, conn = connections.popitem()
+        conn.close()
+
+
+def has_fts_trigram():
+    # SQLite can be built without FTS5, and so without its trigram
+    # tokenizer. Probed once per process on a scratch connection.
+    global _fts_trigram
+    if _fts_trigram is None:
+        probe = sqlite3.connect(":memory:")
+        try:
+            probe.execute(
+                "CREATE VIRTUAL TABLE probe USING fts5(body, tokenize='trigram')"
+            )
+            _fts_trigram = True
+        except sqlite3.OperationalError:
+            _fts_trigram = False
+        finally:
+            probe.close()
+    return _fts_trigram
+
+
+def check_sqlite_version():
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        required = ".".join(str(part) for part in MIN_SQLITE_VERSION)
+        raise RuntimeError(
+            f"SQLite {required} or newer is required; this Python uses "
+            f"SQLite {sqlite3.sqlite_version}. Use a Python build linked "
+            "against a newer SQLite."
+        )
@@ -75,26 +75,14 @@ def insert_detections(conn, thread_pk, thread_source_id, detection_items):
     if not detection_items:
         return 0
 
-    count = 0
+    rows = []
     for item in detection_items:
         comment_pk = item.get("comment_pk")
         source_hash = item.get("source_hash")
         evidence_text = item.get("evidence_text")
         if comment_pk is None and not source_hash and evidence_text:
             source_hash = _hash_detection(thread_source_id, evidence_text)
-
-        conn.execute(
-            """
-            INSERT INTO detections (
-                thread_pk,
-                comment_pk,
-                detection_type,
-                evidence_text,
-                source_hash,
-                created_at_utc
-            ) VALUES (?, ?, ?, ?, ?, ?)
-            ON CONFLICT DO NOTHING
-            """,
+        rows.append(
             (
                 thread_pk,
                 comment_pk,
@@ -102,7 +90,21 @@ def insert_detections(conn, thread_pk, thread_source_id, detection_items):
                 evidence_text,
                 source_hash,
                 item.get("created_at_utc"),
-            ),
+            )
         )
-        count += 1
-    return count
+
+    conn.executemany(
+        """
+        INSERT INTO detections (
+            thread_pk,
+            comment_pk,
+            detection_type,
+            evidence_text,
+            source_hash,
+            created_at_utc
+        ) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT DO NOTHING
+        """,
+        rows,
+    )
+    return len(rows)
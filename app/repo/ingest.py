@@ -1,145 +1,250 @@
-def upsert_thread(conn, thread_dict):
-    conn.execute(
+COMMENT_BATCH_SIZE = 500
+# 15 bound values per thread row keeps a batch well under SQLite's limit.
+THREAD_BATCH_SIZE = 500
+_THREAD_ROW = "(" + ", ".join("?" for _ in range(15)) + ")"
+
+
+def get_thread_versions(conn, source, source_thread_ids):
+    versions = {}
+    source_thread_ids = list(source_thread_ids)
+    for start in range(0, len(source_thread_ids), THREAD_BATCH_SIZE):
+        chunk = source_thread_ids[start : start + THREAD_BATCH_SIZE]
+        placeholders = ", ".join("?" for _ in chunk)
+        rows = conn.execute(
+            f"""
+            SELECT thread_pk, source_thread_id, num_comments_reported, edited_utc
+            FROM threads
+            WHERE source = ? AND source_thread_id IN ({placeholders})
+            """,
+            [source, *chunk],
+        ).fetchall()
+        for row in rows:
+            versions[row["source_thread_id"]] = row
+    return versions
+
+
+def upsert_threads(conn, threads, active_window_days=5):
+    # Returns thread_pks in input order and how many threads are new. A new
+    # thread is one that gets a thread_state row here, which every thread
+    # written through this function has from then on.
+    threads = list(threads)
+    thread_pks = {}
+    for start in range(0, len(threads), THREAD_BATCH_SIZE):
+        chunk = threads[start : start + THREAD_BATCH_SIZE]
+        values = ", ".join(_THREAD_ROW for _ in chunk)
+        rows = conn.execute(
+            f"""
+            INSERT INTO threads (
+                source,
+                source_thread_id,
+                url,
+                subreddit,
+                title,
+                body,
+                author,
+                created_at_utc,
+                last_seen_at_utc,
+                last_content_at_utc,
+                is_deleted,
+                is_removed,
+                score,
+                num_comments_reported,
+                edited_utc
+            ) VALUES {values}
+            ON CONFLICT (source, source_thread_id) DO UPDATE SET
+                url=excluded.url,
+                subreddit=excluded.subreddit,
+                title=excluded.title,
+                body=excluded.body,
+                author=excluded.author,
+                last_seen_at_utc=excluded.last_seen_at_utc,
+                last_content_at_utc=excluded.last_content_at_utc,
+                is_deleted=excluded.is_deleted,
+                is_removed=excluded.is_removed,
+                score=excluded.score,
+                num_comments_reported=excluded.num_comments_reported,
+                edited_utc=excluded.edited_utc
+            RETURNING source, source_thread_id, thread_pk
+            """,
+            [value for thread in chunk for value in thread],
+        ).fetchall()
+        for row in rows:
+            thread_pks[(row["source"], row["source_thread_id"])] = row["thread_pk"]
+
+    ordered_pks = [
+        thread_pks[(thread.source, thread.source_thread_id)] for thread in threads
+    ]
+    cursor = conn.executemany(
         """
-        INSERT INTO threads (
-            source,
-            source_thread_id,
-            url,
-            subreddit,
-            title,
-            body,
-            author,
-            created_at_utc,
-            last_seen_at_utc,
-            last_content_at_utc,
-            is_deleted,
-            is_removed,
-            score,
-            num_comments_reported
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT (source, source_thread_id) DO UPDATE SET
-            url=excluded.url,
-            subreddit=excluded.subreddit,
-            title=excluded.title,
-            body=excluded.body,
-            author=excluded.author,
-            last_seen_at_utc=excluded.last_seen_at_utc,
-            last_content_at_utc=excluded.last_content_at_utc,
-            is_deleted=excluded.is_deleted,
-            is_removed=excluded.is_removed,
-            score=excluded.score,
-            num_comments_reported=excluded.num_comments_reported
+        INSERT OR IGNORE INTO thread_state (
+            thread_pk,
+            watching,
+            active_until_utc,
+            closed,
+            in_area,
+            genai_eval_count,
+            flagged,
+            dismissed
+        ) VALUES (?, 0, ?, 0, 'unknown', 0, 0, 0)
         """,
-        (
-            thread_dict["source"],
-            thread_dict["source_thread_id"],
-            thread_dict.get("url"),
-            thread_dict.get("subreddit"),
-            thread_dict.get("title"),
-            thread_dict.get("body"),
-            thread_dict.get("author"),
-            thread_dict.get("created_at_utc"),
-            thread_dict.get("last_seen_at_utc"),
-            thread_dict.get("last_content_at_utc"),
-            thread_dict.get("is_deleted"),
-            thread_dict.get("is_removed"),
-            thread_dict.get("score"),
-            thread_dict.get("num_comments_reported"),
-        ),
+        [
+            (thread_pk, thread.created_at_utc + (active_window_days * 86400))
+            for thread_pk, thread in zip(ordered_pks, threads)
+        ],
     )
-    row = conn.execute(
-        """
-        SELECT thread_pk
-        FROM threads
-        WHERE source = ? AND source_thread_id = ?
-        """,
-        (thread_dict["source"], thread_dict["source_thread_id"]),
-    ).fetchone()
-    return row["thread_pk"]
+    return ordered_pks, max(cursor.rowcount, 0)
+
 
+def _batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
-def upsert_comments(conn, thread_pk, comment_dicts):
-    if not comment_dicts:
-        return 0
 
-    payload = []
-    for comment in comment_dicts:
-        payload.append(
-            (
+def upsert_comments(conn, comments, batch_size=COMMENT_BATCH_SIZE):
+    # comments are CommentRecord tuples (already carrying thread_pk), so each
+    # batch goes to executemany as is.
+    count = 0
+    for batch in _batched(comments, batch_size):
+        conn.executemany(
+            """
+            INSERT INTO comments (
                 thread_pk,
-                comment["source"],
-                comment["source_comment_id"],
-                comment.get("parent_source_id"),
-                comment.get("author"),
-                comment.get("body"),
-                comment.get("created_at_utc"),
-                comment.get("last_seen_at_utc"),
-                comment.get("is_deleted"),
-                comment.get("depth"),
-                comment.get("permalink"),
-            )
+                source,
+                source_comment_id,
+                parent_source_id,
+                author,
+                body,
+                created_at_utc,
+                last_seen_at_utc,
+                is_deleted,
+                depth,
+                permalink
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (source, source_comment_id) DO UPDATE SET
+                thread_pk=excluded.thread_pk,
+                parent_source_id=excluded.parent_source_id,
+                author=excluded.author,
+                body=excluded.body,
+                last_seen_at_utc=excluded.last_seen_at_utc,
+                is_deleted=excluded.is_deleted,
+                depth=excluded.depth,
+                permalink=excluded.permalink
+            """,
+            batch,
         )
+        count += len(batch)
+    return count
+
+
+def get_subreddit_cursors(conn):
+    rows = conn.execute("SELECT * FROM subreddit_cursors").fetchall()
+    return {
+        row["subreddit"]: {
+            "newest_fullname": row["newest_fullname"],
+            "newest_created_utc": row["newest_created_utc"],
+            "fetch_limit": row["fetch_limit"],
+        }
+        for row in rows
+    }
+
 
-    conn.executemany(
+def upsert_subreddit_cursor(conn, subreddit, cursor, now_utc):
+    conn.execute(
         """
-        INSERT INTO comments (
-            thread_pk,
-            source,
-            source_comment_id,
-            parent_source_id,
-            author,
-            body,
-            created_at_utc,
-            last_seen_at_utc,
-            is_deleted,
-            depth,
-            permalink
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT (source, source_comment_id) DO UPDATE SET
-            thread_pk=excluded.thread_pk,
-            parent_source_id=excluded.parent_source_id,
-            author=excluded.author,
-            body=excluded.body,
-            last_seen_at_utc=excluded.last_seen_at_utc,
-            is_deleted=excluded.is_deleted,
-            depth=excluded.depth,
-            permalink=excluded.permalink
+        INSERT INTO subreddit_cursors (
+            subreddit,
+            newest_fullname,
+            newest_created_utc,
+            fetch_limit,
+            updated_at_utc
+        ) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (subreddit) DO UPDATE SET
+            newest_fullname=excluded.newest_fullname,
+            newest_created_utc=excluded.newest_created_utc,
+            fetch_limit=excluded.fetch_limit,
+            updated_at_utc=excluded.updated_at_utc
         """,
-        payload,
+        (
+            subreddit,
+            cursor.get("newest_fullname"),
+            cursor.get("newest_created_utc"),
+            cursor.get("fetch_limit"),
+            now_utc,
+        ),
     )
-    return len(comment_dicts)
 
 
-def ensure_thread_state(conn, thread_pk, thread_created_at_utc, active_window_days=5):
-    row = conn.execute(
-        "SELECT thread_pk FROM thread_state WHERE thread_pk = ?",
-        (thread_pk,),
+def get_backfill_checkpoint(conn, subreddit, since_utc):
+    return conn.execute(
+        """
+        SELECT *
+        FROM backfill_checkpoints
+        WHERE subreddit = ? AND since_utc = ?
+        """,
+        (subreddit, since_utc),
     ).fetchone()
-    if row is not None:
-        return
 
-    active_until_utc = thread_created_at_utc + (active_window_days * 86400)
+
+def upsert_backfill_checkpoint(conn, subreddit, since_utc, checkpoint, now_utc):
     conn.execute(
         """
-        INSERT INTO thread_state (
-            thread_pk,
-            watching,
-            active_until_utc,
-            closed,
-            in_area,
-            genai_eval_count,
-            flagged,
-            dismissed
+        INSERT INTO backfill_checkpoints (
+            subreddit,
+            since_utc,
+            after_fullname,
+            oldest_created_utc,
+            threads_done,
+            comments_done,
+            completed_at_utc,
+            updated_at_utc
         ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (subreddit, since_utc) DO UPDATE SET
+            after_fullname=excluded.after_fullname,
+            oldest_created_utc=excluded.oldest_created_utc,
+            threads_done=excluded.threads_done,
+            comments_done=excluded.comments_done,
+            completed_at_utc=excluded.completed_at_utc,
+            updated_at_utc=excluded.updated_at_utc
         """,
         (
-            thread_pk,
-            0,
-            active_until_utc,
-            0,
-            "unknown",
-            0,
-            0,
-            0,
+            subreddit,
+            since_utc,
+            checkpoint.get("after_fullname"),
+            checkpoint.get("oldest_created_utc"),
+            checkpoint.get("threads_done", 0),
+            checkpoint.get("comments_done", 0),
+            checkpoint.get("completed_at_utc"),
+            now_utc,
         ),
     )
+
+
+def list_active_source_thread_ids(conn, source, subreddits, now_utc):
+    # Open threads in the configured subreddits still inside their active
+    # window, watched or not: the cursor never lists a known post again, so
+    # this is how their later comments get ingested and rules-checked.
+    subreddits = [subreddit.lower() for subreddit in subreddits]
+    if not subreddits:
+        return []
+    placeholders = ", ".join("?" for _ in subreddits)
+    rows = conn.execute(
+        f"""
+        SELECT t.source_thread_id
+        FROM threads AS t
+        JOIN thread_state AS ts ON ts.thread_pk = t.thread_pk
+        WHERE t.source = ?
+            AND LOWER(t.subreddit) IN ({placeholders})
+            AND ts.active_until_utc >= ?
+            AND COALESCE(ts.closed, 0) = 0
+            AND COALESCE(ts.dismissed, 0) = 0
+        ORDER BY t.created_at_utc DESC
+        """,
+        (source, *subreddits, now_utc),
+    ).fetchall()
+    return [row["source_thread_id"] for row in rows]
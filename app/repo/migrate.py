@@ -1,8 +1,8 @@
 import os
 import time
 
-from .db import connect, get_db_path
-from .schema import create_all
+from .db import check_sqlite_version, connect, get_db_path, has_fts_trigram
+from .schema import FTS_MIGRATIONS, MIGRATIONS, create_all
 
 
 def _ensure_schema_migrations(conn):
@@ -18,7 +18,27 @@ def _ensure_schema_migrations(conn):
     conn.commit()
 
 
+def _apply_migrations(conn):
+    applied = {
+        row["version"]
+        for row in conn.execute("SELECT version FROM schema_migrations").fetchall()
+    }
+    for version, notes, script in MIGRATIONS:
+        if version in applied:
+            continue
+        if version in FTS_MIGRATIONS and not has_fts_trigram():
+            continue
+        conn.executescript(script)
+        conn.execute(
+            "INSERT INTO schema_migrations (version, applied_at_utc, notes) "
+            "VALUES (?, ?, ?)",
+            (version, int(time.time()), notes),
+        )
+        conn.commit()
+
+
 def init_db(db_path=None):
+    check_sqlite_version()
     if db_path is None:
         db_path = get_db_path()
 
@@ -37,6 +57,7 @@ def init_db(db_path=None):
                 (1, int(time.time()), "initial schema"),
             )
             conn.commit()
+        _apply_migrations(conn)
     finally:
         conn.close()
 
@@ -44,5 +65,5 @@ def init_db(db_path=None):
 def init_db_if_missing(db_path=None):
     if db_path is None:
         db_path = get_db_path()
-    if not os.path.exists(db_path):
-        init_db(db_path)
+    # init_db is idempotent, so existing databases only pick up new migrations.
+    init_db(db_path)
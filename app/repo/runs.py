@@ -1,18 +1,149 @@
-from .db import connect
+from .db import get_connection
 
 
 def list_recent_runs(limit=20):
-    conn = connect()
-    try:
-        rows = conn.execute(
-            """
-            SELECT *
-            FROM runs
-            ORDER BY started_at_utc DESC
-            LIMIT ?
+    conn = get_connection()
+    rows = conn.execute(
+        """
+        SELECT *
+        FROM runs
+        ORDER BY started_at_utc DESC
+        LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
+    return rows
+
+
+def get_run(conn, run_id):
+    return conn.execute(
+        "SELECT * FROM runs WHERE run_id = ?",
+        (run_id,),
+    ).fetchone()
+
+
+def save_run_checkpoint(
+    conn, run_id, stage, totals, now_utc, subreddit=None, thread_pk=None
+):
+    # Written in the same transaction as the work it covers, so a resumed run
+    # continues from the last commit with its counters intact.
+    conn.execute(
+        """
+        UPDATE runs
+        SET checkpoint_stage = ?,
+            checkpoint_subreddit = ?,
+            checkpoint_thread_pk = ?,
+            checkpoint_at_utc = ?,
+            threads_fetched = ?,
+            comments_fetched = ?,
+            threads_new = ?,
+            threads_updated = ?,
+            threads_skipped = ?,
+            rule_hits = ?,
+            genai_calls = ?,
+            threads_flagged = ?
+        WHERE run_id = ?
+        """,
+        (
+            stage,
+            subreddit,
+            thread_pk,
+            now_utc,
+            totals["threads_fetched"],
+            totals["comments_fetched"],
+            totals["threads_new"],
+            totals["threads_updated"],
+            totals["threads_skipped"],
+            totals["rule_hits"],
+            totals["genai_calls"],
+            totals["threads_flagged"],
+            run_id,
+        ),
+    )
+
+
+def add_run_threads(conn, run_id, thread_pks):
+    conn.executemany(
+        "INSERT OR IGNORE INTO run_threads (run_id, thread_pk) VALUES (?, ?)",
+        [(run_id, thread_pk) for thread_pk in thread_pks],
+    )
+
+
+def add_unchecked_run_threads(conn, run_id):
+    # Threads an earlier run ingested but never rules-checked (it failed or
+    # was killed first). Their subreddit cursors have already moved past
+    # them, so unless this run adopts them only a --resume would score them.
+    return conn.execute(
+        """
+        INSERT OR IGNORE INTO run_threads (run_id, thread_pk)
+        SELECT ?, ts.thread_pk
+        FROM thread_state AS ts
+        WHERE ts.last_rule_check_at_utc IS NULL
+            AND COALESCE(ts.closed, 0) = 0
+            AND COALESCE(ts.dismissed, 0) = 0
+            AND EXISTS (
+                SELECT 1
+                FROM run_threads AS rt
+                WHERE rt.thread_pk = ts.thread_pk AND rt.run_id != ?
+            )
+        """,
+        (run_id, run_id),
+    ).rowcount
+
+
+def list_run_thread_pks(conn, run_id, after_thread_pk=None):
+    rows = conn.execute(
+        """
+        SELECT thread_pk
+        FROM run_threads
+        WHERE run_id = ? AND thread_pk > ?
+        ORDER BY thread_pk
+        """,
+        (run_id, after_thread_pk or 0),
+    ).fetchall()
+    return [row["thread_pk"] for row in rows]
+
+
+def list_run_source_thread_ids(conn, run_id, source):
+    rows = conn.execute(
+        """
+        SELECT t.source_thread_id
+        FROM run_threads AS rt
+        JOIN threads AS t ON t.thread_pk = rt.thread_pk
+        WHERE rt.run_id = ? AND t.source = ?
+        """,
+        (run_id, source),
+    ).fetchall()
+    return [row["source_thread_id"] for row in rows]
+
+
+def set_run_thread_results(conn, run_id, thread_results):
+    conn.executemany(
+        """
+        UPDATE run_threads
+        SET positive_hit = ?
+        WHERE run_id = ? AND thread_pk = ?
+        """,
+        [
+            (1 if result["positive_hit"] else 0, run_id, thread_pk)
+            for thread_pk, result in thread_results.items()
+        ],
+    )
+
+
+def get_run_thread_results(conn, run_id, thread_pks):
+    results = {}
+    thread_pks = list(thread_pks)
+    for start in range(0, len(thread_pks), 500):
+        chunk = thread_pks[start : start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        for row in conn.execute(
+            f"""
+            SELECT thread_pk, positive_hit
+            FROM run_threads
+            WHERE run_id = ? AND thread_pk IN ({placeholders})
             """,
-            (limit,),
-        ).fetchall()
-        return rows
-    finally:
-        conn.close()
+            [run_id, *chunk],
+        ):
+            results[row["thread_pk"]] = {"positive_hit": row["positive_hit"] == 1}
+    return results
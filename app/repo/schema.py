@@ -209,3 +209,317 @@ def create_all(conn):
             ON review_actions (action_type);
         """
     )
+
+
+MIGRATIONS = (
+    (
+        2,
+        "thread_state geo token state",
+        """
+        ALTER TABLE thread_state ADD COLUMN geo_tokens TEXT;
+        ALTER TABLE thread_state ADD COLUMN geo_config_hash TEXT;
+        """,
+    ),
+    (
+        3,
+        "keyword term change log",
+        """
+        CREATE TABLE IF NOT EXISTS config_term_changes (
+            change_pk INTEGER PRIMARY KEY AUTOINCREMENT,
+            config_key TEXT,
+            term TEXT,
+            change_type TEXT,
+            created_at_utc INTEGER,
+            applied_at_utc INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_config_term_changes_applied_at_utc
+            ON config_term_changes (applied_at_utc);
+        """,
+    ),
+    (
+        4,
+        "per-subreddit fetch cursors",
+        """
+        CREATE TABLE IF NOT EXISTS subreddit_cursors (
+            subreddit TEXT PRIMARY KEY,
+            newest_fullname TEXT,
+            newest_created_utc INTEGER,
+            fetch_limit INTEGER,
+            updated_at_utc INTEGER
+        );
+        """,
+    ),
+    (
+        5,
+        "submission edit marker and skipped comment fetches",
+        """
+        ALTER TABLE threads ADD COLUMN edited_utc INTEGER;
+        ALTER TABLE runs ADD COLUMN threads_skipped INTEGER;
+        """,
+    ),
+    (
+        6,
+        "wall-clock fetch time per run",
+        """
+        ALTER TABLE runs ADD COLUMN fetch_seconds REAL;
+        """,
+    ),
+    (
+        7,
+        "time spent throttled by the rate-limit governor",
+        """
+        ALTER TABLE runs ADD COLUMN throttle_seconds REAL;
+        """,
+    ),
+    (
+        8,
+        "resumable historical backfill checkpoints",
+        """
+        CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+            subreddit TEXT NOT NULL,
+            since_utc INTEGER NOT NULL,
+            after_fullname TEXT,
+            oldest_created_utc INTEGER,
+            threads_done INTEGER NOT NULL DEFAULT 0,
+            comments_done INTEGER NOT NULL DEFAULT 0,
+            completed_at_utc INTEGER,
+            updated_at_utc INTEGER,
+            PRIMARY KEY (subreddit, since_utc)
+        );
+        """,
+    ),
+    (
+        9,
+        "checkpointed, resumable ingest runs",
+        """
+        ALTER TABLE runs ADD COLUMN checkpoint_stage TEXT;
+        ALTER TABLE runs ADD COLUMN checkpoint_subreddit TEXT;
+        ALTER TABLE runs ADD COLUMN checkpoint_thread_pk INTEGER;
+        ALTER TABLE runs ADD COLUMN checkpoint_at_utc INTEGER;
+        CREATE TABLE IF NOT EXISTS run_threads (
+            run_id TEXT NOT NULL,
+            thread_pk INTEGER NOT NULL,
+            positive_hit INTEGER,
+            PRIMARY KEY (run_id, thread_pk),
+            FOREIGN KEY (run_id) REFERENCES runs(run_id),
+            FOREIGN KEY (thread_pk) REFERENCES threads(thread_pk)
+        ) WITHOUT ROWID;
+        """,
+    ),
+    (
+        10,
+        "config version counter for snapshot invalidation",
+        """
+        CREATE TABLE IF NOT EXISTS config_version (
+            version INTEGER NOT NULL
+        );
+        INSERT INTO config_version (version)
+        SELECT 1 WHERE NOT EXISTS (SELECT 1 FROM config_version);
+        CREATE TRIGGER IF NOT EXISTS trg_config_version_insert
+        AFTER INSERT ON config
+        BEGIN
+            UPDATE config_version SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_config_version_update
+        AFTER UPDATE ON config
+        BEGIN
+            UPDATE config_version SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_config_version_delete
+        AFTER DELETE ON config
+        BEGIN
+            UPDATE config_version SET version = version + 1;
+        END;
+        """,
+    ),
+    (
+        11,
+        "latest draft pointer and queue sort key on thread_state",
+        """
+        ALTER TABLE thread_state ADD COLUMN latest_draft_pk INTEGER;
+        ALTER TABLE thread_state ADD COLUMN queue_sort_key INTEGER;
+
+        UPDATE thread_state
+        SET latest_draft_pk = (
+                SELECT dr.draft_pk
+                FROM draft_responses AS dr
+                WHERE dr.thread_pk = thread_state.thread_pk
+                ORDER BY dr.updated_at_utc DESC, dr.created_at_utc DESC,
+                    dr.draft_pk DESC
+                LIMIT 1
+            ),
+            queue_sort_key = (
+                SELECT COALESCE(
+                    thread_state.flagged_at_utc,
+                    t.last_content_at_utc,
+                    t.created_at_utc,
+                    0
+                )
+                FROM threads AS t
+                WHERE t.thread_pk = thread_state.thread_pk
+            );
+
+        CREATE INDEX IF NOT EXISTS idx_thread_state_queue
+            ON thread_state (flagged, queue_sort_key, thread_pk)
+            WHERE COALESCE(dismissed, 0) = 0;
+
+        CREATE TRIGGER IF NOT EXISTS trg_draft_responses_latest_insert
+        AFTER INSERT ON draft_responses
+        BEGIN
+            UPDATE thread_state
+            SET latest_draft_pk = (
+                SELECT draft_pk
+                FROM draft_responses
+                WHERE thread_pk = NEW.thread_pk
+                ORDER BY updated_at_utc DESC, created_at_utc DESC, draft_pk DESC
+                LIMIT 1
+            )
+            WHERE thread_pk = NEW.thread_pk;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_draft_responses_latest_update
+        AFTER UPDATE OF updated_at_utc, created_at_utc ON draft_responses
+        BEGIN
+            UPDATE thread_state
+            SET latest_draft_pk = (
+                SELECT draft_pk
+                FROM draft_responses
+                WHERE thread_pk = NEW.thread_pk
+                ORDER BY updated_at_utc DESC, created_at_utc DESC, draft_pk DESC
+                LIMIT 1
+            )
+            WHERE thread_pk = NEW.thread_pk;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_draft_responses_latest_delete
+        AFTER DELETE ON draft_responses
+        BEGIN
+            UPDATE thread_state
+            SET latest_draft_pk = (
+                SELECT draft_pk
+                FROM draft_responses
+                WHERE thread_pk = OLD.thread_pk
+                ORDER BY updated_at_utc DESC, created_at_utc DESC, draft_pk DESC
+                LIMIT 1
+            )
+            WHERE thread_pk = OLD.thread_pk;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_thread_state_queue_insert
+        AFTER INSERT ON thread_state
+        BEGIN
+            UPDATE thread_state
+            SET queue_sort_key = (
+                SELECT COALESCE(
+                    NEW.flagged_at_utc,
+                    t.last_content_at_utc,
+                    t.created_at_utc,
+                    0
+                )
+                FROM threads AS t
+                WHERE t.thread_pk = NEW.thread_pk
+            )
+            WHERE thread_pk = NEW.thread_pk;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_thread_state_queue_flagged
+        AFTER UPDATE OF flagged_at_utc ON thread_state
+        WHEN NEW.flagged_at_utc IS NOT OLD.flagged_at_utc
+        BEGIN
+            UPDATE thread_state
+            SET queue_sort_key = (
+                SELECT COALESCE(
+                    NEW.flagged_at_utc,
+                    t.last_content_at_utc,
+                    t.created_at_utc,
+                    0
+                )
+                FROM threads AS t
+                WHERE t.thread_pk = NEW.thread_pk
+            )
+            WHERE thread_pk = NEW.thread_pk;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_threads_queue_content
+        AFTER UPDATE OF last_content_at_utc, created_at_utc ON threads
+        WHEN NEW.last_content_at_utc IS NOT OLD.last_content_at_utc
+            OR NEW.created_at_utc IS NOT OLD.created_at_utc
+        BEGIN
+            UPDATE thread_state
+            SET queue_sort_key = COALESCE(
+                flagged_at_utc,
+                NEW.last_content_at_utc,
+                NEW.created_at_utc,
+                0
+            )
+            WHERE thread_pk = NEW.thread_pk;
+        END;
+        """,
+    ),
+    (
+        12,
+        "trigram full-text indexes over threads and comments",
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS threads_fts USING fts5(
+            title,
+            body,
+            content='threads',
+            content_rowid='thread_pk',
+            tokenize='trigram'
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(
+            body,
+            content='comments',
+            content_rowid='comment_pk',
+            tokenize='trigram'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trg_threads_fts_insert
+        AFTER INSERT ON threads
+        BEGIN
+            INSERT INTO threads_fts (rowid, title, body)
+            VALUES (NEW.thread_pk, NEW.title, NEW.body);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_threads_fts_delete
+        AFTER DELETE ON threads
+        BEGIN
+            INSERT INTO threads_fts (threads_fts, rowid, title, body)
+            VALUES ('delete', OLD.thread_pk, OLD.title, OLD.body);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_threads_fts_update
+        AFTER UPDATE OF title, body ON threads
+        WHEN NEW.title IS NOT OLD.title OR NEW.body IS NOT OLD.body
+        BEGIN
+            INSERT INTO threads_fts (threads_fts, rowid, title, body)
+            VALUES ('delete', OLD.thread_pk, OLD.title, OLD.body);
+            INSERT INTO threads_fts (rowid, title, body)
+            VALUES (NEW.thread_pk, NEW.title, NEW.body);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_comments_fts_insert
+        AFTER INSERT ON comments
+        BEGIN
+            INSERT INTO comments_fts (rowid, body)
+            VALUES (NEW.comment_pk, NEW.body);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_comments_fts_delete
+        AFTER DELETE ON comments
+        BEGIN
+            INSERT INTO comments_fts (comments_fts, rowid, body)
+            VALUES ('delete', OLD.comment_pk, OLD.body);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_comments_fts_update
+        AFTER UPDATE OF body ON comments
+        WHEN NEW.body IS NOT OLD.body
+        BEGIN
+            INSERT INTO comments_fts (comments_fts, rowid, body)
+            VALUES ('delete', OLD.comment_pk, OLD.body);
+            INSERT INTO comments_fts (rowid, body)
+            VALUES (NEW.comment_pk, NEW.body);
+        END;
+
+        INSERT INTO threads_fts (threads_fts) VALUES ('rebuild');
+        INSERT INTO comments_fts (comments_fts) VALUES ('rebuild');
+        """,
+    ),
+)
+
+# Need the FTS5 trigram tokenizer. Without it they are skipped (and not
+# recorded), so they apply on a later start once SQLite supports it.
+FTS_MIGRATIONS = (12,)
@@ -0,0 +1,133 @@
+from .db import get_connection, has_fts_trigram
+
+# The trigram tokenizer cannot look up anything shorter than one trigram.
+MIN_QUERY_LENGTH = 3
+# Comment pks further apart than this are looked up as separate rowid spans,
+# so one old comment in a batch doesn't pull in every match since. Each span
+# costs about a millisecond, so past FTS_MAX_SPANS scanning is cheaper.
+FTS_SPAN_GAP = 1000
+FTS_MAX_SPANS = 20
+
+
+def fts_available(conn):
+    # False on SQLite builds without FTS5's trigram tokenizer, where the FTS
+    # migration is skipped; callers fall back to scanning.
+    if not has_fts_trigram():
+        return False
+    row = conn.execute(
+        """
+        SELECT COUNT(*)
+        FROM sqlite_master
+        WHERE type = 'table' AND name IN ('threads_fts', 'comments_fts')
+        """
+    ).fetchone()
+    return row[0] == 2
+
+
+def fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def fts_match_any(literals):
+    return " OR ".join(fts_phrase(literal) for literal in literals)
+
+
+def _rowid_spans(rowids, gap):
+    rowids = sorted(rowids)
+    spans = []
+    start = previous = rowids[0]
+    for rowid in rowids[1:]:
+        if rowid - previous > gap:
+            spans.append((start, previous))
+            start = rowid
+        previous = rowid
+    spans.append((start, previous))
+    return spans
+
+
+def match_comment_pks(conn, literals, comment_pks, max_spans=FTS_MAX_SPANS):
+    # The comment_pks whose body contains any of the literals
+    # (case-insensitive substrings). Each run of nearby pks is one bounded
+    # lookup; None when they are spread too thin for that to beat scanning.
+    comment_pks = set(comment_pks)
+    if not literals or not comment_pks:
+        return set()
+    spans = _rowid_spans(comment_pks, FTS_SPAN_GAP)
+    if len(spans) > max_spans:
+        return None
+    query = fts_match_any(literals)
+    matched = set()
+    for low, high in spans:
+        rows = conn.execute(
+            """
+            SELECT rowid
+            FROM comments_fts
+            WHERE comments_fts MATCH ?
+                AND rowid BETWEEN ? AND ?
+            """,
+            (query, low, high),
+        ).fetchall()
+        matched.update(row[0] for row in rows)
+    return matched & comment_pks
+
+
+def search_threads(query, limit, before=None):
+    # Newest first; `before` is the last thread_pk of the previous page.
+    conn = get_connection()
+    before_filter = ""
+    params = [fts_phrase(query)]
+    if before is not None:
+        before_filter = "AND threads_fts.rowid < ?"
+        params.append(before)
+    params.append(limit)
+    return conn.execute(
+        f"""
+        SELECT
+            t.thread_pk,
+            t.subreddit,
+            t.title,
+            t.url,
+            t.created_at_utc,
+            ts.flagged
+        FROM threads_fts
+        JOIN threads AS t ON t.thread_pk = threads_fts.rowid
+        LEFT JOIN thread_state AS ts ON ts.thread_pk = t.thread_pk
+        WHERE threads_fts MATCH ?
+            {before_filter}
+        ORDER BY threads_fts.rowid DESC
+        LIMIT ?
+        """,
+        params,
+    ).fetchall()
+
+
+def search_comments(query, limit, before=None):
+    # Newest first; `before` is the last comment_pk of the previous page.
+    conn = get_connection()
+    before_filter = ""
+    params = [fts_phrase(query)]
+    if before is not None:
+        before_filter = "AND comments_fts.rowid < ?"
+        params.append(before)
+    params.append(limit)
+    return conn.execute(
+        f"""
+        SELECT
+            c.comment_pk,
+            c.thread_pk,
+            c.author,
+            c.body,
+            c.created_at_utc,
+            c.permalink,
+            t.subreddit,
+            t.title
+        FROM comments_fts
+        JOIN comments AS c ON c.comment_pk = comments_fts.rowid
+        JOIN threads AS t ON t.thread_pk = c.thread_pk
+        WHERE comments_fts MATCH ?
+            {before_filter}
+        ORDER BY comments_fts.rowid DESC
+        LIMIT ?
+        """,
+        params,
+    ).fetchall()
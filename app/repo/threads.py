@@ -1,202 +1,396 @@
-from .db import connect
+from .db import get_connection
+from .search import fts_available
 
 
-def list_flagged_threads(limit=50, offset=0):
-    conn = connect()
-    try:
-        rows = conn.execute(
-            """
-            SELECT
-                t.*,
-                ts.watching,
-                ts.active_until_utc,
-                ts.closed,
-                ts.in_area,
-                ts.location_confidence,
-                ts.flagged,
-                ts.flagged_at_utc,
-                ts.dismissed,
-                ts.snoozed_until_utc,
-                dr.draft_text AS latest_draft_text,
-                dr.status AS latest_draft_status
+def list_flagged_threads(limit=50, after=None):
+    # Keyset pagination over idx_thread_state_queue: `after` is the
+    # (queue_sort_key, thread_pk) of the last row of the previous page.
+    conn = get_connection()
+    after_filter = ""
+    params = []
+    if after is not None:
+        after_filter = "AND (ts.queue_sort_key, ts.thread_pk) < (?, ?)"
+        params.extend(after)
+    params.append(limit)
+    rows = conn.execute(
+        f"""
+        SELECT
+            t.*,
+            ts.watching,
+            ts.active_until_utc,
+            ts.closed,
+            ts.in_area,
+            ts.location_confidence,
+            ts.flagged,
+            ts.flagged_at_utc,
+            ts.dismissed,
+            ts.snoozed_until_utc,
+            ts.queue_sort_key,
+            dr.draft_text AS latest_draft_text,
+            dr.status AS latest_draft_status
+        FROM thread_state AS ts
+        JOIN threads AS t ON t.thread_pk = ts.thread_pk
+        LEFT JOIN draft_responses AS dr ON dr.draft_pk = ts.latest_draft_pk
+        WHERE ts.flagged = 1 AND COALESCE(ts.dismissed, 0) = 0
+            {after_filter}
+        ORDER BY ts.queue_sort_key DESC, ts.thread_pk DESC
+        LIMIT ?
+        """,
+        params,
+    ).fetchall()
+    return rows
+
+
+def list_recent_threads(limit=50):
+    conn = get_connection()
+    rows = conn.execute(
+        """
+        SELECT
+            t.*,
+            ts.watching,
+            ts.in_area,
+            ts.last_rule_check_at_utc
+        FROM threads AS t
+        LEFT JOIN thread_state AS ts ON ts.thread_pk = t.thread_pk
+        ORDER BY COALESCE(last_content_at_utc, created_at_utc) DESC
+        LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
+    return rows
+
+
+PRELOAD_CHUNK_SIZE = 500
+
+
+def load_threads_with_state(conn, thread_pks, chunk_size=PRELOAD_CHUNK_SIZE):
+    # One row per thread carrying both the threads and thread_state columns,
+    # keyed by thread_pk. Threads without a state row are left out.
+    thread_pks = list(dict.fromkeys(thread_pks))
+    rows = {}
+    for start in range(0, len(thread_pks), chunk_size):
+        chunk = thread_pks[start : start + chunk_size]
+        placeholders = ", ".join("?" for _ in chunk)
+        for row in conn.execute(
+            f"""
+            SELECT ts.*, t.*
             FROM threads AS t
             JOIN thread_state AS ts ON ts.thread_pk = t.thread_pk
-            LEFT JOIN draft_responses AS dr
-                ON dr.draft_pk = (
-                    SELECT draft_pk
-                    FROM draft_responses
-                    WHERE thread_pk = t.thread_pk
-                    ORDER BY updated_at_utc DESC, created_at_utc DESC
-                    LIMIT 1
-                )
-            WHERE ts.flagged = 1 AND (ts.dismissed IS NULL OR ts.dismissed = 0)
-            ORDER BY COALESCE(ts.flagged_at_utc, t.last_content_at_utc, t.created_at_utc) DESC
-            LIMIT ? OFFSET ?
+            WHERE t.thread_pk IN ({placeholders})
             """,
-            (limit, offset),
-        ).fetchall()
-        return rows
-    finally:
-        conn.close()
+            chunk,
+        ):
+            rows[row["thread_pk"]] = row
+    return rows
 
 
-def list_recent_threads(limit=50):
-    conn = connect()
-    try:
-        rows = conn.execute(
-            """
+def load_comment_slices(conn, since_by_thread, chunk_size=PRELOAD_CHUNK_SIZE):
+    # since_by_thread maps thread_pk to a created_at_utc cutoff (None for all
+    # comments). Returns thread_pk -> comments newer than the cutoff, oldest
+    # first, read in one ordered scan per chunk.
+    items = list(since_by_thread.items())
+    slices = {thread_pk: [] for thread_pk, _ in items}
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start : start + chunk_size]
+        values = ", ".join("(?, ?)" for _ in chunk)
+        params = [value for item in chunk for value in item]
+        for row in conn.execute(
+            f"""
+            WITH wanted (thread_pk, since_utc) AS (VALUES {values})
+            SELECT c.*
+            FROM wanted AS w
+            JOIN comments AS c ON c.thread_pk = w.thread_pk
+            WHERE w.since_utc IS NULL OR c.created_at_utc > w.since_utc
+            ORDER BY c.thread_pk, c.created_at_utc ASC
+            """,
+            params,
+        ):
+            slices[row["thread_pk"]].append(row)
+    return slices
+
+
+def iter_open_thread_chunks(conn, chunk_size, checked_only=False, match=None):
+    # With checked_only, yield only threads the rules stage has seen and the
+    # comments it had already evaluated as of last_rule_check_at_utc. With an
+    # FTS match expression, only threads whose title, body or comments match
+    # are yielded, with just the matching comments.
+    last_thread_pk = 0
+    checked_filter = ""
+    if checked_only:
+        checked_filter = "AND ts.last_rule_check_at_utc IS NOT NULL"
+    match_filter = ""
+    comment_filter = ""
+    match_params = ()
+    comment_params = ()
+    if match is not None and fts_available(conn):
+        match_filter = """
+            AND (
+                t.thread_pk IN (
+                    SELECT rowid FROM threads_fts WHERE threads_fts MATCH ?
+                )
+                OR t.thread_pk IN (
+                    SELECT c.thread_pk
+                    FROM comments AS c
+                    WHERE c.comment_pk IN (
+                        SELECT rowid FROM comments_fts WHERE comments_fts MATCH ?
+                    )
+                )
+            )
+        """
+        comment_filter = """
+            AND comment_pk IN (
+                SELECT rowid FROM comments_fts WHERE comments_fts MATCH ?
+            )
+        """
+        match_params = (match, match)
+        comment_params = (match,)
+    while True:
+        threads = conn.execute(
+            f"""
             SELECT
-                t.*,
-                ts.watching,
-                ts.in_area,
+                t.thread_pk,
+                t.subreddit,
+                t.title,
+                t.body,
+                t.created_at_utc,
                 ts.last_rule_check_at_utc
             FROM threads AS t
-            LEFT JOIN thread_state AS ts ON ts.thread_pk = t.thread_pk
-            ORDER BY COALESCE(last_content_at_utc, created_at_utc) DESC
+            JOIN thread_state AS ts ON ts.thread_pk = t.thread_pk
+            WHERE t.thread_pk > ?
+                AND COALESCE(ts.closed, 0) = 0
+                AND COALESCE(ts.dismissed, 0) = 0
+                {checked_filter}
+                {match_filter}
+            ORDER BY t.thread_pk
             LIMIT ?
             """,
-            (limit,),
+            (last_thread_pk, *match_params, chunk_size),
         ).fetchall()
-        return rows
-    finally:
-        conn.close()
+        if not threads:
+            return
 
+        thread_pks = [row["thread_pk"] for row in threads]
+        placeholders = ", ".join("?" for _ in thread_pks)
+        comments = conn.execute(
+            f"""
+            SELECT thread_pk, comment_pk, body, created_at_utc
+            FROM comments
+            WHERE thread_pk IN ({placeholders})
+                {comment_filter}
+            ORDER BY thread_pk, created_at_utc ASC
+            """,
+            (*thread_pks, *comment_params),
+        ).fetchall()
 
-def list_comments_for_thread(conn, thread_pk):
-    return conn.execute(
-        """
-        SELECT *
+        checked_until = {
+            row["thread_pk"]: row["last_rule_check_at_utc"] for row in threads
+        }
+        comments_by_thread = {}
+        for row in comments:
+            until = checked_until[row["thread_pk"]]
+            if checked_only and (
+                row["created_at_utc"] is None or row["created_at_utc"] > until
+            ):
+                continue
+            comments_by_thread.setdefault(row["thread_pk"], []).append(
+                (row["comment_pk"], row["body"] or "", row["created_at_utc"])
+            )
+
+        yield [
+            (
+                {
+                    "thread_pk": row["thread_pk"],
+                    "subreddit": row["subreddit"],
+                    "title": row["title"] or "",
+                    "body": row["body"] or "",
+                    "created_at_utc": row["created_at_utc"],
+                },
+                comments_by_thread.get(row["thread_pk"], []),
+            )
+            for row in threads
+        ]
+        last_thread_pk = thread_pks[-1]
+
+
+def get_comment_pks_by_source_ids(conn, thread_pk, source_comment_ids):
+    source_comment_ids = list(dict.fromkeys(source_comment_ids))
+    if not source_comment_ids:
+        return {}
+    placeholders = ", ".join("?" for _ in source_comment_ids)
+    rows = conn.execute(
+        f"""
+        SELECT source_comment_id, comment_pk
         FROM comments
-        WHERE thread_pk = ?
-        ORDER BY created_at_utc ASC
+        WHERE thread_pk = ? AND source_comment_id IN ({placeholders})
         """,
-        (thread_pk,),
+        [thread_pk, *source_comment_ids],
     ).fetchall()
+    return {row["source_comment_id"]: row["comment_pk"] for row in rows}
 
 
-def list_comments_since(conn, thread_pk, since_utc):
+def list_rule_hits_for_run(conn, thread_pk, run_id):
+    # Each hit carries the source_comment_id of the comment it matched in,
+    # NULL for title and body hits.
     return conn.execute(
         """
-        SELECT *
-        FROM comments
-        WHERE thread_pk = ? AND created_at_utc > ?
-        ORDER BY created_at_utc ASC
+        SELECT rh.*, c.source_comment_id
+        FROM rule_hits AS rh
+        LEFT JOIN comments AS c ON c.comment_pk = rh.comment_pk
+        WHERE rh.thread_pk = ? AND rh.run_id = ?
+        ORDER BY rh.created_at_utc DESC
         """,
-        (thread_pk, since_utc),
+        (thread_pk, run_id),
     ).fetchall()
 
 
-def get_comment_pk_by_source_id(conn, thread_pk, source_comment_id):
+def get_thread_detail(thread_pk):
+    # Header, state, latest draft and latest eval in one query; comments and
+    # rule hits are paged separately so megathreads stay cheap to open.
+    conn = get_connection()
     row = conn.execute(
         """
-        SELECT comment_pk
-        FROM comments
-        WHERE thread_pk = ? AND source_comment_id = ?
+        SELECT
+            t.*,
+            ts.watching,
+            ts.in_area,
+            ts.flagged,
+            ts.flagged_at_utc,
+            ts.dismissed,
+            ts.snoozed_until_utc,
+            ts.latest_draft_pk,
+            dr.genai_eval_pk AS draft_genai_eval_pk,
+            dr.draft_text,
+            dr.draft_version,
+            dr.status AS draft_status,
+            dr.created_at_utc AS draft_created_at_utc,
+            dr.updated_at_utc AS draft_updated_at_utc,
+            ge.genai_eval_pk,
+            ge.eval_scope,
+            ge.relevant,
+            ge.short_reason,
+            ge.model,
+            ge.status AS eval_status,
+            ge.created_at_utc AS eval_created_at_utc
+        FROM threads AS t
+        LEFT JOIN thread_state AS ts ON ts.thread_pk = t.thread_pk
+        LEFT JOIN draft_responses AS dr ON dr.draft_pk = ts.latest_draft_pk
+        LEFT JOIN genai_evals AS ge
+            ON ge.genai_eval_pk = (
+                SELECT genai_eval_pk
+                FROM genai_evals
+                WHERE thread_pk = t.thread_pk
+                ORDER BY created_at_utc DESC, genai_eval_pk DESC
+                LIMIT 1
+            )
+        WHERE t.thread_pk = ?
         """,
-        (thread_pk, source_comment_id),
+        (thread_pk,),
     ).fetchone()
-    return row["comment_pk"] if row else None
+    if row is None:
+        return None
 
+    latest_draft = None
+    if row["latest_draft_pk"] is not None:
+        latest_draft = {
+            "draft_pk": row["latest_draft_pk"],
+            "thread_pk": row["thread_pk"],
+            "genai_eval_pk": row["draft_genai_eval_pk"],
+            "draft_text": row["draft_text"],
+            "draft_version": row["draft_version"],
+            "status": row["draft_status"],
+            "created_at_utc": row["draft_created_at_utc"],
+            "updated_at_utc": row["draft_updated_at_utc"],
+        }
+    latest_genai_eval = None
+    if row["genai_eval_pk"] is not None:
+        latest_genai_eval = {
+            "genai_eval_pk": row["genai_eval_pk"],
+            "thread_pk": row["thread_pk"],
+            "eval_scope": row["eval_scope"],
+            "relevant": row["relevant"],
+            "short_reason": row["short_reason"],
+            "model": row["model"],
+            "status": row["eval_status"],
+            "created_at_utc": row["eval_created_at_utc"],
+        }
 
-def list_rule_hits_for_run(conn, thread_pk, run_id):
-    return conn.execute(
+    # At most max_genai_evals_per_thread evals write detections, so these
+    # stay small even on busy threads.
+    detections = conn.execute(
         """
         SELECT *
-        FROM rule_hits
-        WHERE thread_pk = ? AND run_id = ?
+        FROM detections
+        WHERE thread_pk = ?
         ORDER BY created_at_utc DESC
         """,
-        (thread_pk, run_id),
+        (thread_pk,),
     ).fetchall()
 
+    return {
+        "thread": row,
+        "thread_state": row,
+        "latest_draft": latest_draft,
+        "latest_genai_eval": latest_genai_eval,
+        "detections": detections,
+    }
 
-def get_comment_source_id(conn, comment_pk):
-    row = conn.execute(
-        """
-        SELECT source_comment_id
-        FROM comments
-        WHERE comment_pk = ?
-        """,
-        (comment_pk,),
-    ).fetchone()
-    return row["source_comment_id"] if row else None
-
-
-def get_thread_detail(thread_pk):
-    conn = connect()
-    try:
-        thread = conn.execute(
-            "SELECT * FROM threads WHERE thread_pk = ?",
-            (thread_pk,),
-        ).fetchone()
-        if thread is None:
-            return None
-
-        thread_state = conn.execute(
-            "SELECT * FROM thread_state WHERE thread_pk = ?",
-            (thread_pk,),
-        ).fetchone()
-
-        comments = conn.execute(
-            """
-            SELECT *
-            FROM comments
-            WHERE thread_pk = ?
-            ORDER BY created_at_utc ASC
-            """,
-            (thread_pk,),
-        ).fetchall()
-
-        latest_draft = conn.execute(
-            """
-            SELECT *
-            FROM draft_responses
-            WHERE thread_pk = ?
-            ORDER BY updated_at_utc DESC, created_at_utc DESC
-            LIMIT 1
-            """,
-            (thread_pk,),
-        ).fetchone()
-
-        latest_genai_eval = conn.execute(
-            """
-            SELECT *
-            FROM genai_evals
-            WHERE thread_pk = ?
-            ORDER BY created_at_utc DESC
-            LIMIT 1
-            """,
-            (thread_pk,),
-        ).fetchone()
 
-        detections = conn.execute(
-            """
-            SELECT *
+def list_thread_comments(thread_pk, marked, limit, after=None):
+    # One page of a thread's comments, oldest first. With marked, only the
+    # comments that carry a rule hit or a detection; otherwise the rest.
+    # `after` is the (created_at_utc, comment_pk) of the previous page's last row.
+    conn = get_connection()
+    membership = "IN" if marked else "NOT IN"
+    after_filter = ""
+    params = [thread_pk, thread_pk, thread_pk]
+    if after is not None:
+        after_filter = "AND (COALESCE(c.created_at_utc, 0), c.comment_pk) > (?, ?)"
+        params.extend(after)
+    params.append(limit)
+    return conn.execute(
+        f"""
+        WITH marked AS (
+            SELECT comment_pk
+            FROM rule_hits
+            WHERE thread_pk = ? AND comment_pk IS NOT NULL
+            UNION
+            SELECT comment_pk
             FROM detections
-            WHERE thread_pk = ?
-            ORDER BY created_at_utc DESC
-            """,
-            (thread_pk,),
-        ).fetchall()
+            WHERE thread_pk = ? AND comment_pk IS NOT NULL
+        )
+        SELECT c.*, COALESCE(c.created_at_utc, 0) AS page_key
+        FROM comments AS c
+        WHERE c.thread_pk = ?
+            AND c.comment_pk {membership} (
+                SELECT comment_pk FROM marked
+            )
+            {after_filter}
+        ORDER BY page_key, c.comment_pk
+        LIMIT ?
+        """,
+        params,
+    ).fetchall()
 
-        rule_hits = conn.execute(
-            """
-            SELECT *
-            FROM rule_hits
-            WHERE thread_pk = ?
-            ORDER BY created_at_utc DESC
-            """,
-            (thread_pk,),
-        ).fetchall()
 
-        return {
-            "thread": thread,
-            "thread_state": thread_state,
-            "comments": comments,
-            "latest_draft": latest_draft,
-            "latest_genai_eval": latest_genai_eval,
-            "detections": detections,
-            "rule_hits": rule_hits,
-        }
-    finally:
-        conn.close()
+def list_thread_rule_hits(thread_pk, limit, before=None):
+    # Newest first; `before` is the (created_at_utc, rule_hit_pk) of the
+    # previous page's last row.
+    conn = get_connection()
+    before_filter = ""
+    params = [thread_pk]
+    if before is not None:
+        before_filter = "AND (rh.created_at_utc, rh.rule_hit_pk) < (?, ?)"
+        params.extend(before)
+    params.append(limit)
+    return conn.execute(
+        f"""
+        SELECT rh.*, c.source_comment_id
+        FROM rule_hits AS rh
+        LEFT JOIN comments AS c ON c.comment_pk = rh.comment_pk
+        WHERE rh.thread_pk = ?
+            {before_filter}
+        ORDER BY rh.created_at_utc DESC, rh.rule_hit_pk DESC
+        LIMIT ?
+        """,
+        params,
+    ).fetchall()
@@ -8,25 +8,98 @@ def index():
     return queue()
 
 
-@bp.route("/queue")
-def queue():
+QUEUE_PAGE_SIZE = 50
+COMMENT_PAGE_SIZE = 100
+RULE_HIT_PAGE_SIZE = 50
+
+
+def _parse_cursor(value):
+    sort_key, _, row_pk = (value or "").partition(":")
+    try:
+        return int(sort_key), int(row_pk)
+    except ValueError:
+        return None
+
+
+def _paged(rows, page_size, sort_column, pk_column):
+    # Rows were fetched with page_size + 1 to tell whether another page exists.
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, f"{last[sort_column]}:{last[pk_column]}"
+
+
+def _queue_page():
     from app.repo.threads import list_flagged_threads
 
-    threads = list_flagged_threads()
-    return render_template("queue.html", threads=threads, selected=None)
+    after = request.args.get("after")
+    threads, next_after = _paged(
+        list_flagged_threads(QUEUE_PAGE_SIZE + 1, _parse_cursor(after)),
+        QUEUE_PAGE_SIZE,
+        "queue_sort_key",
+        "thread_pk",
+    )
+    return threads, after, next_after
+
+
+@bp.route("/queue")
+def queue():
+    threads, after, next_after = _queue_page()
+    return render_template(
+        "queue.html",
+        threads=threads,
+        selected=None,
+        after=after,
+        next_after=next_after,
+    )
 
 
 @bp.route("/queue/<int:thread_pk>")
 def queue_detail(thread_pk):
-    from app.repo.threads import get_thread_detail, list_flagged_threads
+    from app.repo.threads import (
+        get_thread_detail,
+        list_thread_comments,
+        list_thread_rule_hits,
+    )
 
-    threads = list_flagged_threads()
+    threads, after, next_after = _queue_page()
     detail = get_thread_detail(thread_pk)
+    if detail is not None:
+        # Comments with hits or detections come first; the rest, and older
+        # pages of either, load on demand.
+        comment_view = request.args.get("comments")
+        if comment_view != "other":
+            comment_view = "marked"
+        detail["comment_view"] = comment_view
+        detail["comments"], detail["comments_next"] = _paged(
+            list_thread_comments(
+                thread_pk,
+                comment_view == "marked",
+                COMMENT_PAGE_SIZE + 1,
+                _parse_cursor(request.args.get("comments_after")),
+            ),
+            COMMENT_PAGE_SIZE,
+            "page_key",
+            "comment_pk",
+        )
+        detail["rule_hits"], detail["rule_hits_next"] = _paged(
+            list_thread_rule_hits(
+                thread_pk,
+                RULE_HIT_PAGE_SIZE + 1,
+                _parse_cursor(request.args.get("hits_before")),
+            ),
+            RULE_HIT_PAGE_SIZE,
+            "created_at_utc",
+            "rule_hit_pk",
+        )
     return render_template(
         "queue.html",
         threads=threads,
         selected=detail,
         not_found=detail is None,
+        after=after,
+        next_after=next_after,
     )
 
 
@@ -49,7 +122,59 @@ def threads():
 
 @bp.route("/config")
 def config():
-    return render_template("config.html")
+    from app.repo.config import get_config_snapshot
+    from app.repo.db import get_connection
+
+    snapshot = get_config_snapshot(get_connection())
+    return render_template(
+        "config.html", config_items=snapshot.items(), config_version=snapshot.version
+    )
+
+
+SEARCH_PAGE_SIZE = 50
+
+
+def _search_page(search, query, param, pk_column):
+    before = request.args.get(param, "")
+    rows = search(
+        query, SEARCH_PAGE_SIZE + 1, int(before) if before.isdigit() else None
+    )
+    if len(rows) <= SEARCH_PAGE_SIZE:
+        return rows, None
+    rows = rows[:SEARCH_PAGE_SIZE]
+    return rows, rows[-1][pk_column]
+
+
+@bp.route("/search")
+def search():
+    from app.repo.db import get_connection
+    from app.repo.search import (
+        MIN_QUERY_LENGTH,
+        fts_available,
+        search_comments,
+        search_threads,
+    )
+
+    query = request.args.get("q", "").strip()
+    results = None
+    available = fts_available(get_connection())
+    if available and len(query) >= MIN_QUERY_LENGTH:
+        results = {}
+        results["threads"], results["threads_next"] = _search_page(
+            search_threads, query, "threads_before", "thread_pk"
+        )
+        results["comments"], results["comments_next"] = _search_page(
+            search_comments, query, "comments_before", "comment_pk"
+        )
+    return render_template(
+        "search.html",
+        query=query,
+        threads_before=request.args.get("threads_before"),
+        comments_before=request.args.get("comments_before"),
+        results=results,
+        available=available,
+        min_query_length=MIN_QUERY_LENGTH,
+    )
 
 
 @bp.route("/runs")
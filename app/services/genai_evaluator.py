@@ -1,4 +1,5 @@
 import json
+import time
 
 from openai import OpenAI
 
@@ -94,6 +95,24 @@ def call_genai(payload, api_key):
     return result, tokens_in, tokens_out
 
 
+def call_genai_offline(payload, api_key=None, latency_seconds=0.0):
+    # Stand-in for call_genai in offline replays: same return shape, decided
+    # from the rule evidence alone, with an optional simulated call latency.
+    if latency_seconds:
+        time.sleep(latency_seconds)
+    hit_types = {hit.get("hit_type") for hit in payload.get("rule_evidence") or []}
+    relevant = 1 if "keyword" in hit_types and "negative" not in hit_types else 0
+    result = {
+        "relevant": relevant,
+        "short_reason": "offline replay" if relevant else None,
+        "draft_response": "Offline replay draft." if relevant else None,
+        "detection_items": [],
+    }
+    tokens_in = len(json.dumps(payload)) // 4
+    tokens_out = 20 if relevant else 5
+    return result, tokens_in, tokens_out
+
+
 def evaluate_thread(payload, api_key):
     result, _, _ = call_genai(payload, api_key)
     return result
@@ -1,41 +1,113 @@
 import time
+from collections import namedtuple
 
+# Field order matches the INSERT column lists in repo/ingest.py, so records
+# go straight to execute/executemany.
+ThreadRecord = namedtuple(
+    "ThreadRecord",
+    [
+        "source",
+        "source_thread_id",
+        "url",
+        "subreddit",
+        "title",
+        "body",
+        "author",
+        "created_at_utc",
+        "last_seen_at_utc",
+        "last_content_at_utc",
+        "is_deleted",
+        "is_removed",
+        "score",
+        "num_comments_reported",
+        "edited_utc",
+    ],
+)
 
-def normalize_submission(submission):
-    now = int(time.time())
+CommentRecord = namedtuple(
+    "CommentRecord",
+    [
+        "thread_pk",
+        "source",
+        "source_comment_id",
+        "parent_source_id",
+        "author",
+        "body",
+        "created_at_utc",
+        "last_seen_at_utc",
+        "is_deleted",
+        "depth",
+        "permalink",
+    ],
+)
+
+
+def _edited_utc(item):
+    # PRAW reports False for never-edited items, else the edit timestamp.
+    edited = getattr(item, "edited", False)
+    if not edited or isinstance(edited, bool):
+        return None
+    return int(edited)
+
+
+def normalize_submission(submission, now=None):
+    if now is None:
+        now = int(time.time())
     author = submission.author.name if submission.author else None
-    return {
-        "source": "reddit",
-        "source_thread_id": submission.id,
-        "url": submission.url,
-        "subreddit": str(submission.subreddit),
-        "title": submission.title,
-        "body": submission.selftext or "",
-        "author": author,
-        "created_at_utc": int(submission.created_utc),
-        "last_seen_at_utc": now,
-        "last_content_at_utc": int(submission.created_utc),
-        "is_deleted": 1 if submission.selftext == "[deleted]" else None,
-        "is_removed": 1 if submission.selftext == "[removed]" else None,
-        "score": getattr(submission, "score", None),
-        "num_comments_reported": getattr(submission, "num_comments", None),
-    }
-
-
-def normalize_comment(comment, thread_pk, thread_source_id):
-    now = int(time.time())
+    selftext = submission.selftext
+    created_at_utc = int(submission.created_utc)
+    return ThreadRecord(
+        "reddit",
+        submission.id,
+        submission.url,
+        str(submission.subreddit),
+        submission.title,
+        selftext or "",
+        author,
+        created_at_utc,
+        now,
+        created_at_utc,
+        1 if selftext == "[deleted]" else None,
+        1 if selftext == "[removed]" else None,
+        getattr(submission, "score", None),
+        getattr(submission, "num_comments", None),
+        _edited_utc(submission),
+    )
+
+
+def needs_comment_fetch(previous, thread):
+    # An unchanged comment count and edit marker means the stored comment
+    # forest is current, so the most expensive API call can be skipped.
+    return not (
+        previous is not None
+        and thread.num_comments_reported is not None
+        and previous["num_comments_reported"] == thread.num_comments_reported
+        and previous["edited_utc"] == thread.edited_utc
+    )
+
+
+def normalize_comment(comment, thread_pk, thread_source_id, now=None):
+    if now is None:
+        now = int(time.time())
     author = comment.author.name if comment.author else None
     body = comment.body or ""
-    return {
-        "thread_pk": thread_pk,
-        "source": "reddit",
-        "source_comment_id": comment.id,
-        "parent_source_id": comment.parent_id,
-        "author": author,
-        "body": body,
-        "created_at_utc": int(comment.created_utc),
-        "last_seen_at_utc": now,
-        "is_deleted": 1 if body == "[deleted]" else None,
-        "depth": getattr(comment, "depth", None),
-        "permalink": getattr(comment, "permalink", None),
-    }
+    return CommentRecord(
+        thread_pk,
+        "reddit",
+        comment.id,
+        comment.parent_id,
+        author,
+        body,
+        int(comment.created_utc),
+        now,
+        1 if body == "[deleted]" else None,
+        getattr(comment, "depth", None),
+        getattr(comment, "permalink", None),
+    )
+
+
+def normalize_comments(comments, thread_pk, thread_source_id, now=None):
+    if now is None:
+        now = int(time.time())
+    for comment in comments:
+        yield normalize_comment(comment, thread_pk, thread_source_id, now)
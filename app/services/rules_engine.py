@@ -1,23 +1,295 @@
-def _normalize_terms(terms):
+import os
+import pickle
+import re
+from collections import deque
+
+# Bump when the compiled rule layout changes so stale disk caches are ignored.
+RULES_FORMAT_VERSION = 3
+
+GEO_CONFIG_KEYS = ("geo_service_area", "geo_out_of_area")
+
+RULE_CONFIG_KEYS = (
+    "keywords_include",
+    "keywords_intent",
+    "keywords_negative",
+) + GEO_CONFIG_KEYS
+
+TERM_LISTS = (
+    ("keywords_include", "keyword"),
+    ("keywords_intent", "phrase"),
+    ("keywords_negative", "negative"),
+)
+
+HIT_FLAGS = {
+    "keyword": "has_service",
+    "phrase": "has_intent",
+    "negative": "has_negative",
+}
+
+GEO_LISTS = (
+    ("geo_out_of_area", "false"),
+    ("geo_service_area", "true"),
+)
+
+# Opt-in term syntax; terms without a prefix keep plain substring matching.
+#   word:ac              whole word only ("ac", not "back")
+#   prefix:pest          word starting with the term ("pests", not "carpet")
+#   phrase:need ~2 plumber   words in order, up to 2 words in between
+#   re:water ?heater     regular expression, case-insensitive
+TERM_SYNTAX = (
+    ("word:", "word"),
+    ("prefix:", "prefix"),
+    ("phrase:", "phrase"),
+    ("re:", "regex"),
+)
+PHRASE_GAP = re.compile(r"~(\d+)")
+
+_COMPILED_RULES = {}
+
+
+def _normalize_term(term, syntax=False):
+    # Regexes keep their case (lowercasing turns \D into \d, [A-Z] into
+    # [a-z]) and match with IGNORECASE; everything else is a literal.
+    term = str(term).strip()
+    if syntax and term[:3].lower() == "re:":
+        return "re:" + term[3:].strip()
+    return term.lower()
+
+
+def _normalize_terms(terms, syntax=False):
     if not terms:
         return []
-    return [str(term).strip().lower() for term in terms if str(term).strip()]
+    return [_normalize_term(term, syntax) for term in terms if str(term).strip()]
+
+
+def _build_automaton(patterns):
+    goto = [{}]
+    outputs = [[]]
+    for pattern_id, pattern in enumerate(patterns):
+        state = 0
+        for char in pattern:
+            next_state = goto[state].get(char)
+            if next_state is None:
+                next_state = len(goto)
+                goto[state][char] = next_state
+                goto.append({})
+                outputs.append([])
+            state = next_state
+        outputs[state].append(pattern_id)
+
+    # Resolve failure links breadth-first and fold them into a full
+    # transition table so scanning never has to walk the failure chain.
+    fail = [0] * len(goto)
+    delta = [None] * len(goto)
+    delta[0] = dict(goto[0])
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        transitions = dict(delta[fail[state]])
+        transitions.update(goto[state])
+        delta[state] = transitions
+        for char, child in goto[state].items():
+            if state:
+                fail[child] = delta[fail[state]].get(char, 0)
+            outputs[child].extend(outputs[fail[child]])
+            queue.append(child)
+
+    return delta, [tuple(output) for output in outputs]
+
+
+def _scan(automaton, text, state=0, found=None):
+    delta, outputs = automaton
+    if found is None:
+        found = set()
+    for char in text:
+        state = delta[state].get(char, 0)
+        if outputs[state]:
+            found.update(outputs[state])
+    return found, state
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
 
+def _compile_phrase(body):
+    parts = []
+    words = []
+    gap = 0
+    for token in body.split():
+        gap_match = PHRASE_GAP.fullmatch(token)
+        if gap_match:
+            gap = int(gap_match.group(1))
+            continue
+        if parts:
+            if gap:
+                parts.append(r"\W+(?:\w+\W+){0,%d}" % gap)
+            else:
+                parts.append(r"\W+")
+        parts.append(re.escape(token))
+        words.append(token)
+        gap = 0
+    if not words:
+        return None, None
+    regex = re.compile(r"(?<!\w)" + "".join(parts) + r"(?!\w)")
+    return regex, max(words, key=len)
 
-def _find_terms(text, terms):
+
+def _parse_term(term):
+    for prefix, kind in TERM_SYNTAX:
+        if not term.startswith(prefix):
+            continue
+        body = term[len(prefix):].strip()
+        if not body:
+            return None, None, None
+        if kind == "phrase":
+            regex, anchor = _compile_phrase(body)
+            if regex is None:
+                return None, None, None
+            return kind, anchor, regex
+        if kind == "regex":
+            try:
+                return kind, None, re.compile(body, re.IGNORECASE)
+            except re.error:
+                return None, None, None
+        return kind, body, None
+    return "substring", term, None
+
+
+def _compile_lists(config, lists, syntax=False):
+    patterns = []
+    pattern_ids = {}
+    checks = []
+    slots = []
+    regexes = []
+
+    def add_pattern(literal, check):
+        pattern_id = pattern_ids.get((literal, check))
+        if pattern_id is None:
+            pattern_id = len(patterns)
+            pattern_ids[(literal, check)] = pattern_id
+            patterns.append(literal)
+            checks.append(check)
+            slots.append([])
+        return pattern_id
+
+    regex_ids = {}
+    for group_index, (config_key, label) in enumerate(lists):
+        for position, term in enumerate(
+            _normalize_terms(config.get(config_key), syntax)
+        ):
+            slot = (group_index, position, label, term)
+            kind, literal, regex = "substring", term, None
+            if syntax:
+                kind, literal, regex = _parse_term(term)
+            if kind is None:
+                continue
+            if regex is None:
+                check = None if kind == "substring" else kind
+                slots[add_pattern(literal, check)].append(slot)
+                continue
+            regex_index = regex_ids.get(term)
+            if regex_index is None:
+                gate = None
+                if literal:
+                    gate = add_pattern(literal, None)
+                regex_index = len(regexes)
+                regex_ids[term] = regex_index
+                regexes.append((regex, gate, []))
+            regexes[regex_index][2].append(slot)
+
+    return {
+        "automaton": _build_automaton(patterns),
+        "patterns": patterns,
+        "lengths": [len(pattern) for pattern in patterns],
+        "checks": checks,
+        "checked": any(checks),
+        "slots": [tuple(slot) for slot in slots],
+        "regexes": [(regex, gate, tuple(slot)) for regex, gate, slot in regexes],
+    }
+
+
+def compile_rules(config):
+    return {
+        "terms": _compile_lists(config, TERM_LISTS, syntax=True),
+        "geo": _compile_lists(config, GEO_LISTS),
+    }
+
+
+def prefilter_literals(rules):
+    # Literals one of which every term match contains, so a substring index
+    # can narrow the texts worth matching. None when a term has no such
+    # literal (a bare regex) or one the trigram index can't look up.
+    compiled = rules["terms"]
+    if any(gate is None for _, gate, _ in compiled["regexes"]):
+        return None
+    literals = compiled["patterns"]
+    if any(len(literal) < 3 or not literal.isascii() for literal in literals):
+        return None
+    return list(literals)
+
+
+def _scan_checked(compiled, text):
+    delta, outputs = compiled["automaton"]
+    lengths = compiled["lengths"]
+    checks = compiled["checks"]
+    text_length = len(text)
+    found = set()
+    state = 0
+    for index, char in enumerate(text):
+        state = delta[state].get(char, 0)
+        if not outputs[state]:
+            continue
+        for pattern_id in outputs[state]:
+            if pattern_id in found:
+                continue
+            check = checks[pattern_id]
+            if check is not None:
+                start = index - lengths[pattern_id] + 1
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if (
+                    check == "word"
+                    and index + 1 < text_length
+                    and _is_word_char(text[index + 1])
+                ):
+                    continue
+            found.add(pattern_id)
+    return found
+
+
+def _match_slots(compiled, found, text=None):
+    slots = compiled["slots"]
+    matched = []
+    for pattern_id in found:
+        matched.extend(slots[pattern_id])
+    if text is not None:
+        for regex, gate, regex_slots in compiled["regexes"]:
+            if gate is not None and gate not in found:
+                continue
+            if regex.search(text):
+                matched.extend(regex_slots)
+    matched.sort()
+    return matched
+
+
+def _match_text(rules, text):
     if not text:
         return []
+    compiled = rules["terms"]
     haystack = text.lower()
-    matches = []
-    for term in terms:
-        if term and term in haystack:
-            matches.append(term)
-    return matches
+    if compiled["checked"]:
+        found = _scan_checked(compiled, haystack)
+    else:
+        found, _ = _scan(compiled["automaton"], haystack)
+    if not found and not compiled["regexes"]:
+        return []
+    return _match_slots(compiled, found, haystack)
 
 
-def _build_hits(terms, hit_type, context, comment_pk=None):
+def _find_hits(rules, text, context, comment_pk=None):
     hits = []
-    for term in terms:
+    for _, _, hit_type, term in _match_text(rules, text):
         hits.append(
             {
                 "hit_type": hit_type,
@@ -29,6 +301,38 @@ def _build_hits(terms, hit_type, context, comment_pk=None):
     return hits
 
 
+def load_compiled_rules(config, config_hash, cache_dir=None):
+    key = f"{RULES_FORMAT_VERSION}-{config_hash}"
+    rules = _COMPILED_RULES.get(key)
+    if rules is not None:
+        return rules
+
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, f"rules-{key}.pickle")
+        try:
+            with open(cache_path, "rb") as handle:
+                rules = pickle.load(handle)
+        except Exception:
+            rules = None
+
+    if rules is None:
+        rules = compile_rules(config)
+        if cache_path:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                temp_path = f"{cache_path}.{os.getpid()}.tmp"
+                with open(temp_path, "wb") as handle:
+                    pickle.dump(rules, handle, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_path, cache_path)
+            except OSError:
+                pass
+
+    _COMPILED_RULES.clear()
+    _COMPILED_RULES[key] = rules
+    return rules
+
+
 def _get_value(obj, key, default=None):
     try:
         return obj[key]
@@ -36,77 +340,114 @@ def _get_value(obj, key, default=None):
         return default
 
 
-def evaluate_comment(comment, config):
-    hits = []
+def evaluate_comment(comment, config, rules=None):
+    if rules is None:
+        rules = compile_rules(config)
     body = comment["body"] or ""
-
-    service_terms = _normalize_terms(config.get("keywords_include"))
-    intent_terms = _normalize_terms(config.get("keywords_intent"))
-    negative_terms = _normalize_terms(config.get("keywords_negative"))
-
-    hits.extend(
-        _build_hits(
-            _find_terms(body, service_terms),
-            "keyword",
-            "comment",
-            comment_pk=comment["comment_pk"],
-        )
-    )
-    hits.extend(
-        _build_hits(
-            _find_terms(body, intent_terms),
-            "phrase",
-            "comment",
-            comment_pk=comment["comment_pk"],
-        )
-    )
-    hits.extend(
-        _build_hits(
-            _find_terms(body, negative_terms),
-            "negative",
-            "comment",
-            comment_pk=comment["comment_pk"],
-        )
-    )
-    return hits
+    return _find_hits(rules, body, "comment", comment_pk=comment["comment_pk"])
 
 
-def evaluate_thread(thread, comments, config):
+def evaluate_thread(thread, comments, config, rules=None):
+    if rules is None:
+        rules = compile_rules(config)
     hits = []
     title = _get_value(thread, "title") or ""
     body = _get_value(thread, "body") or ""
 
-    service_terms = _normalize_terms(config.get("keywords_include"))
-    intent_terms = _normalize_terms(config.get("keywords_intent"))
-    negative_terms = _normalize_terms(config.get("keywords_negative"))
+    hits.extend(_find_hits(rules, title, "title"))
+    hits.extend(_find_hits(rules, body, "body"))
 
-    hits.extend(
-        _build_hits(_find_terms(title, service_terms), "keyword", "title")
-    )
-    hits.extend(
-        _build_hits(_find_terms(title, intent_terms), "phrase", "title")
-    )
-    hits.extend(
-        _build_hits(_find_terms(title, negative_terms), "negative", "title")
-    )
+    for comment in comments:
+        hits.extend(evaluate_comment(comment, config, rules))
 
-    hits.extend(
-        _build_hits(_find_terms(body, service_terms), "keyword", "body")
-    )
-    hits.extend(
-        _build_hits(_find_terms(body, intent_terms), "phrase", "body")
-    )
-    hits.extend(
-        _build_hits(_find_terms(body, negative_terms), "negative", "body")
+    return hits
+
+
+def evaluate_batch(comment_pks, thread_pks, bodies, config, rules=None, contexts=None):
+    if rules is None:
+        rules = compile_rules(config)
+
+    hits = {
+        "thread_pk": [],
+        "comment_pk": [],
+        "hit_type": [],
+        "matched_term": [],
+        "match_context": [],
+    }
+    hit_thread_pks = hits["thread_pk"]
+    hit_comment_pks = hits["comment_pk"]
+    hit_types = hits["hit_type"]
+    hit_terms = hits["matched_term"]
+    hit_contexts = hits["match_context"]
+    thread_flags = {}
+
+    for index, (comment_pk, thread_pk, body) in enumerate(
+        zip(comment_pks, thread_pks, bodies)
+    ):
+        flags = thread_flags.get(thread_pk)
+        if flags is None:
+            flags = {
+                "has_service": False,
+                "has_intent": False,
+                "has_negative": False,
+                "hit_count": 0,
+            }
+            thread_flags[thread_pk] = flags
+
+        matched = _match_text(rules, body)
+        if not matched:
+            continue
+        context = contexts[index] if contexts is not None else "comment"
+        for _, _, hit_type, term in matched:
+            hit_thread_pks.append(thread_pk)
+            hit_comment_pks.append(comment_pk)
+            hit_types.append(hit_type)
+            hit_terms.append(term)
+            hit_contexts.append(context)
+            flags[HIT_FLAGS[hit_type]] = True
+        flags["hit_count"] += len(matched)
+
+    return hits, thread_flags
+
+
+def evaluate_threads(chunk, config, rules=None):
+    comment_pks = []
+    thread_pks = []
+    bodies = []
+    contexts = []
+    for thread, comments in chunk:
+        thread_pk = thread["thread_pk"]
+        for context in ("title", "body"):
+            comment_pks.append(None)
+            thread_pks.append(thread_pk)
+            bodies.append(thread[context] or "")
+            contexts.append(context)
+        for comment_pk, body, _ in comments:
+            comment_pks.append(comment_pk)
+            thread_pks.append(thread_pk)
+            bodies.append(body)
+            contexts.append("comment")
+
+    return evaluate_batch(
+        comment_pks, thread_pks, bodies, config, rules, contexts=contexts
     )
 
-    for comment in comments:
-        hits.extend(evaluate_comment(comment, config))
 
-    return hits
+def decide_watch(flags, in_area, include_unknown=True):
+    positive_hit = (
+        not flags.get("has_negative", False)
+        and flags.get("has_service", False)
+        and flags.get("has_intent", False)
+    )
+    should_watch = positive_hit
+    if in_area == "false":
+        should_watch = False
+    elif in_area == "unknown" and not include_unknown:
+        should_watch = False
+    return positive_hit, should_watch
 
 
-def infer_location(thread, comments, config):
+def _subreddit_location(thread, config):
     subreddit = (_get_value(thread, "subreddit") or "").lower()
     subreddit_map = config.get("subreddit_geo_map") or {}
     if subreddit and subreddit in subreddit_map:
@@ -115,21 +456,56 @@ def infer_location(thread, comments, config):
             return ("true" if mapped_value else "false", f"subreddit={subreddit}")
         if isinstance(mapped_value, str) and mapped_value.strip():
             return ("true", f"subreddit={subreddit}:{mapped_value.strip()}")
+    return None
 
-    service_tokens = _normalize_terms(config.get("geo_service_area"))
-    out_of_area_tokens = _normalize_terms(config.get("geo_out_of_area"))
 
-    text_chunks = [_get_value(thread, "title") or "", _get_value(thread, "body") or ""]
-    for comment in comments:
-        text_chunks.append(_get_value(comment, "body") or "")
-    combined_text = " ".join(text_chunks).lower()
+def scan_location_tokens(texts, config, rules=None, found=None):
+    if rules is None:
+        rules = compile_rules(config)
+    compiled = rules["geo"]
+    automaton = compiled["automaton"]
+
+    # Equivalent to scanning the space-joined texts, without building them.
+    pattern_ids = set()
+    state = 0
+    for index, text in enumerate(texts):
+        if index:
+            pattern_ids, state = _scan(automaton, " ", state, pattern_ids)
+        pattern_ids, state = _scan(automaton, (text or "").lower(), state, pattern_ids)
+
+    tokens = set(found) if found else set()
+    patterns = compiled["patterns"]
+    tokens.update(patterns[pattern_id] for pattern_id in pattern_ids)
+    return tokens
 
-    for token in out_of_area_tokens:
-        if token and token in combined_text:
-            return ("false", f"text={token}")
 
-    for token in service_tokens:
-        if token and token in combined_text:
-            return ("true", f"text={token}")
+def resolve_location(thread, tokens, config, rules=None):
+    subreddit_location = _subreddit_location(thread, config)
+    if subreddit_location is not None:
+        return subreddit_location
+
+    if rules is None:
+        rules = compile_rules(config)
+    compiled = rules["geo"]
+    found = {
+        pattern_id
+        for pattern_id, pattern in enumerate(compiled["patterns"])
+        if pattern in tokens
+    }
+    if found:
+        _, _, in_area, token = _match_slots(compiled, found)[0]
+        return (in_area, f"text={token}")
 
     return ("unknown", None)
+
+
+def infer_location(thread, comments, config, rules=None):
+    subreddit_location = _subreddit_location(thread, config)
+    if subreddit_location is not None:
+        return subreddit_location
+
+    texts = [_get_value(thread, "title") or "", _get_value(thread, "body") or ""]
+    for comment in comments:
+        texts.append(_get_value(comment, "body") or "")
+    tokens = scan_location_tokens(texts, config, rules)
+    return resolve_location(thread, tokens, config, rules)
@@ -0,0 +1,116 @@
+import random
+import string
+
+SUBREDDITS = ["Atlanta", "DecaturGA", "Marietta", "Boston", "AskReddit"]
+
+
+def _make_words(rng, count, min_length=3, max_length=9):
+    words = set()
+    while len(words) < count:
+        length = rng.randint(min_length, max_length)
+        words.add("".join(rng.choice(string.ascii_lowercase) for _ in range(length)))
+    return sorted(words)
+
+
+def build_config(
+    seed=0,
+    service_terms=200,
+    intent_terms=100,
+    negative_terms=50,
+    geo_terms=40,
+):
+    rng = random.Random(seed)
+    words = _make_words(rng, service_terms + intent_terms + negative_terms + geo_terms)
+    rng.shuffle(words)
+    cursor = 0
+
+    def take(count):
+        nonlocal cursor
+        chunk = words[cursor : cursor + count]
+        cursor += count
+        return chunk
+
+    services = take(service_terms)
+    # Intent entries are mostly two-word phrases, like "looking for".
+    intent_words = take(intent_terms)
+    intents = [
+        f"{word} {rng.choice(intent_words)}" if index % 3 else word
+        for index, word in enumerate(intent_words)
+    ]
+    negatives = take(negative_terms)
+    geo = take(geo_terms)
+    split = len(geo) // 2
+    return {
+        "keywords_include": services,
+        "keywords_intent": intents,
+        "keywords_negative": negatives,
+        "include_unknown_location": True,
+        "active_window_days": 5,
+        "geo_service_area": geo[:split],
+        "geo_out_of_area": geo[split:],
+        "subreddit_geo_map": {"atlanta": True},
+    }
+
+
+def build_corpus(
+    config,
+    seed=0,
+    threads=500,
+    comments_per_thread=40,
+    comment_words=30,
+    vocabulary=5000,
+    keyword_density=0.01,
+    megathread_rate=0.01,
+):
+    rng = random.Random(seed)
+    vocab = _make_words(rng, vocabulary)
+    keywords = []
+    for key in (
+        "keywords_include",
+        "keywords_intent",
+        "keywords_negative",
+        "geo_service_area",
+        "geo_out_of_area",
+    ):
+        keywords.extend(config.get(key) or [])
+
+    def sentence(word_count):
+        tokens = []
+        for _ in range(max(1, word_count)):
+            if keywords and rng.random() < keyword_density:
+                tokens.append(rng.choice(keywords))
+            else:
+                tokens.append(rng.choice(vocab))
+        return " ".join(tokens)
+
+    corpus = []
+    comment_pk = 0
+    base_utc = 1_700_000_000
+    for thread_pk in range(1, threads + 1):
+        created_at_utc = base_utc + thread_pk * 600
+        thread = {
+            "thread_pk": thread_pk,
+            "subreddit": rng.choice(SUBREDDITS),
+            "title": sentence(rng.randint(5, 15)),
+            "body": sentence(int(rng.expovariate(1 / (comment_words * 3)))),
+            "author": f"user{rng.randint(1, 1000)}",
+            "created_at_utc": created_at_utc,
+        }
+
+        count = int(rng.expovariate(1 / comments_per_thread)) if comments_per_thread else 0
+        if rng.random() < megathread_rate:
+            count = comments_per_thread * 50
+        comments = []
+        for index in range(count):
+            comment_pk += 1
+            comments.append(
+                {
+                    "comment_pk": comment_pk,
+                    "thread_pk": thread_pk,
+                    "author": f"user{rng.randint(1, 1000)}",
+                    "body": sentence(int(rng.expovariate(1 / comment_words)) + 1),
+                    "created_at_utc": created_at_utc + index * 30,
+                }
+            )
+        corpus.append((thread, comments))
+    return corpus
@@ -0,0 +1,218 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+APP_ROOT = os.path.join(REPO_ROOT, "app")
+for path in (REPO_ROOT, APP_ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from benchmarks.corpus import build_config, build_corpus
+from services.rules_engine import (
+    compile_rules,
+    evaluate_comment,
+    evaluate_thread,
+    infer_location,
+)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _run_pass(corpus, config, rules):
+    thread_latencies = []
+    hits = 0
+    start = time.perf_counter()
+    for thread, comments in corpus:
+        thread_start = time.perf_counter()
+        hits += len(evaluate_thread(thread, comments, config, rules))
+        infer_location(thread, comments, config, rules)
+        thread_latencies.append(time.perf_counter() - thread_start)
+    thread_seconds = time.perf_counter() - start
+
+    comment_count = 0
+    start = time.perf_counter()
+    for _, comments in corpus:
+        for comment in comments:
+            evaluate_comment(comment, config, rules)
+        comment_count += len(comments)
+    comment_seconds = time.perf_counter() - start
+
+    return {
+        "hits": hits,
+        "thread_seconds": thread_seconds,
+        "comment_seconds": comment_seconds,
+        "comment_count": comment_count,
+        "thread_latencies": thread_latencies,
+    }
+
+
+def _measure_allocations(corpus, config, rules):
+    # Sum of per-thread peak working memory plus GC runs, as a proxy for
+    # allocation pressure; tracemalloc slows things down, so this is a
+    # separate pass from the timed ones.
+    gc_before = sum(stat["collections"] for stat in gc.get_stats())
+    transient_bytes = 0
+    max_thread_bytes = 0
+    tracemalloc.start()
+    try:
+        start_bytes, _ = tracemalloc.get_traced_memory()
+        for thread, comments in corpus:
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            evaluate_thread(thread, comments, config, rules)
+            infer_location(thread, comments, config, rules)
+            _, peak = tracemalloc.get_traced_memory()
+            transient_bytes += peak - current
+            max_thread_bytes = max(max_thread_bytes, peak - current)
+        end_bytes, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "transient_bytes": transient_bytes,
+        "max_thread_bytes": max_thread_bytes,
+        "retained_bytes": end_bytes - start_bytes,
+        "gc_collections": sum(stat["collections"] for stat in gc.get_stats())
+        - gc_before,
+    }
+
+
+def run_benchmark(args):
+    config = build_config(
+        seed=args.seed,
+        service_terms=args.service_terms,
+        intent_terms=args.intent_terms,
+        negative_terms=args.negative_terms,
+        geo_terms=args.geo_terms,
+    )
+    corpus = build_corpus(
+        config,
+        seed=args.seed,
+        threads=args.threads,
+        comments_per_thread=args.comments_per_thread,
+        comment_words=args.comment_words,
+        vocabulary=args.vocabulary,
+        keyword_density=args.keyword_density,
+    )
+
+    start = time.perf_counter()
+    rules = compile_rules(config)
+    compile_seconds = time.perf_counter() - start
+
+    best = None
+    for _ in range(max(1, args.repeat)):
+        result = _run_pass(corpus, config, rules)
+        if best is None or result["comment_seconds"] < best["comment_seconds"]:
+            best = result
+
+    latencies = best["thread_latencies"]
+    comment_count = best["comment_count"]
+    return {
+        "commit": _git_commit(),
+        "created_at_utc": int(time.time()),
+        "python": platform.python_version(),
+        "params": vars(args),
+        "corpus": {
+            "threads": len(corpus),
+            "comments": comment_count,
+            "hits": best["hits"],
+        },
+        "results": {
+            "compile_seconds": compile_seconds,
+            "comments_per_second": comment_count / max(best["comment_seconds"], 1e-9),
+            "threads_per_second": len(corpus) / max(best["thread_seconds"], 1e-9),
+            "thread_latency_p50_ms": _percentile(latencies, 50) * 1000,
+            "thread_latency_p99_ms": _percentile(latencies, 99) * 1000,
+            "thread_latency_max_ms": max(latencies) * 1000,
+            **_measure_allocations(corpus, config, rules),
+        },
+    }
+
+
+def compare(report, baseline, max_regression):
+    regressions = []
+    current = report["results"]
+    previous = baseline.get("results", {})
+    for key in ("comments_per_second", "threads_per_second"):
+        if previous.get(key) and current[key] < previous[key] * (1 - max_regression):
+            regressions.append(f"{key}: {previous[key]:.1f} -> {current[key]:.1f}")
+    for key in ("thread_latency_p99_ms", "transient_bytes"):
+        if previous.get(key) and current[key] > previous[key] * (1 + max_regression):
+            regressions.append(f"{key}: {previous[key]:.1f} -> {current[key]:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the rules engine over a synthetic Reddit corpus."
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=500)
+    parser.add_argument("--comments-per-thread", type=int, default=40)
+    parser.add_argument("--comment-words", type=int, default=30)
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    parser.add_argument("--keyword-density", type=float, default=0.01)
+    parser.add_argument("--service-terms", type=int, default=200)
+    parser.add_argument("--intent-terms", type=int, default=100)
+    parser.add_argument("--negative-terms", type=int, default=50)
+    parser.add_argument("--geo-terms", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--compare", help="Earlier JSON report to check against.")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2, sort_keys=True)
+
+    results = report["results"]
+    print(
+        f"{report['corpus']['comments']} comments, "
+        f"{results['comments_per_second']:.0f} comments/s, "
+        f"p99 thread {results['thread_latency_p99_ms']:.2f} ms, "
+        f"{results['transient_bytes']} transient bytes. "
+        f"Wrote {args.output}."
+    )
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        regressions = compare(report, baseline, args.max_regression)
+        if regressions:
+            print("Regressions vs " + args.compare + ":")
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print("No regressions vs " + args.compare + ".")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
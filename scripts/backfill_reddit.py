@@ -0,0 +1,326 @@
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+APP_ROOT = os.path.join(REPO_ROOT, "app")
+if APP_ROOT not in sys.path:
+    sys.path.insert(0, APP_ROOT)
+
+from collectors.rate_limit import RateGovernor, RateLimitExhausted
+from collectors.reddit_collector import (
+    FetchTimer,
+    iter_subreddit_history,
+    prefetch_comment_forests,
+)
+from config import load_env_config
+from repo.config import get_config_snapshot
+from repo.db import close_connection, get_connection
+from repo.ingest import (
+    get_backfill_checkpoint,
+    get_thread_versions,
+    upsert_backfill_checkpoint,
+    upsert_comments,
+    upsert_threads,
+)
+from repo.migrate import init_db_if_missing
+from services.normalize_reddit import (
+    needs_comment_fetch,
+    normalize_comments,
+    normalize_submission,
+)
+
+
+def _parse_since(args):
+    if args.since:
+        since = datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    else:
+        # Whole days, so a resumed --days run finds the same checkpoint.
+        since = datetime.now(timezone.utc) - timedelta(days=args.days)
+        since = since.replace(hour=0, minute=0, second=0, microsecond=0)
+    return int(since.timestamp())
+
+
+def _write_chunk(
+    conn, submissions, args, rate_limiter, fetch_timer, active_window_days
+):
+    now = int(time.time())
+    threads = [normalize_submission(submission, now) for submission in submissions]
+    # A resumed or overlapping backfill skips forests it already stored.
+    previous = get_thread_versions(
+        conn, "reddit", [thread.source_thread_id for thread in threads]
+    )
+    thread_pks, threads_new = upsert_threads(conn, threads, active_window_days)
+    by_id = {
+        submission.id: (thread_pk, thread)
+        for submission, thread_pk, thread in zip(submissions, thread_pks, threads)
+    }
+
+    counts = {
+        "threads_fetched": len(threads),
+        "comments_fetched": 0,
+        "threads_new": threads_new,
+        "threads_updated": len(threads) - threads_new,
+        "threads_skipped": 0,
+    }
+    for submission, comments in prefetch_comment_forests(
+        (
+            (
+                submission,
+                needs_comment_fetch(previous.get(thread.source_thread_id), thread),
+            )
+            for submission, thread in zip(submissions, threads)
+        ),
+        rate_limiter,
+        max_workers=args.workers,
+        timer=fetch_timer,
+    ):
+        if comments is None:
+            counts["threads_skipped"] += 1
+            continue
+        thread_pk, thread = by_id[submission.id]
+        counts["comments_fetched"] += upsert_comments(
+            conn,
+            normalize_comments(comments, thread_pk, thread.source_thread_id, now),
+        )
+    return counts
+
+
+def _backfill_subreddit(
+    conn,
+    reddit,
+    subreddit_name,
+    since_utc,
+    args,
+    rate_limiter,
+    fetch_timer,
+    active_window_days,
+    totals,
+):
+    checkpoint = None if args.restart else get_backfill_checkpoint(
+        conn, subreddit_name, since_utc
+    )
+    if checkpoint is not None and checkpoint["completed_at_utc"]:
+        print(f"r/{subreddit_name}: already backfilled, skipping.")
+        return
+
+    state = {
+        "after_fullname": None,
+        "oldest_created_utc": None,
+        "threads_done": 0,
+        "comments_done": 0,
+        "completed_at_utc": None,
+    }
+    if checkpoint is not None:
+        state.update({key: checkpoint[key] for key in state})
+        print(
+            f"r/{subreddit_name}: resuming after {state['after_fullname']} "
+            f"({state['threads_done']} threads done)."
+        )
+
+    history = iter_subreddit_history(
+        reddit,
+        subreddit_name,
+        since_utc,
+        after=state["after_fullname"],
+        rate_limiter=rate_limiter,
+        timer=fetch_timer,
+    )
+
+    def commit():
+        upsert_backfill_checkpoint(
+            conn, subreddit_name, since_utc, state, int(time.time())
+        )
+        conn.commit()
+
+    while True:
+        chunk = list(islice(history, args.batch_size))
+        if not chunk:
+            break
+        counts = _write_chunk(
+            conn, chunk, args, rate_limiter, fetch_timer, active_window_days
+        )
+        state["after_fullname"] = chunk[-1].fullname
+        state["oldest_created_utc"] = int(chunk[-1].created_utc)
+        state["threads_done"] += len(chunk)
+        state["comments_done"] += counts["comments_fetched"]
+        # The checkpoint commits with the rows it covers, so a resume never
+        # skips a submission that was not written.
+        commit()
+        for key, value in counts.items():
+            totals[key] += value
+        oldest = datetime.fromtimestamp(state["oldest_created_utc"], timezone.utc)
+        print(
+            f"r/{subreddit_name}: {state['threads_done']} threads, "
+            f"{state['comments_done']} comments, back to {oldest:%Y-%m-%d}."
+        )
+
+    state["completed_at_utc"] = int(time.time())
+    commit()
+    print(
+        f"r/{subreddit_name}: done, {state['threads_done']} threads, "
+        f"{state['comments_done']} comments."
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Backfill Reddit history for subreddits back to a date."
+    )
+    parser.add_argument(
+        "--subreddit",
+        action="append",
+        help="Subreddit to backfill (repeatable). Defaults to the configured list.",
+    )
+    window = parser.add_mutually_exclusive_group(required=True)
+    window.add_argument("--since", help="Oldest post date to fetch, YYYY-MM-DD (UTC).")
+    window.add_argument("--days", type=int, help="Fetch this many days back.")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=50,
+        help="Submissions written per transaction and checkpoint.",
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore saved checkpoints and walk each subreddit from the newest post.",
+    )
+    args = parser.parse_args()
+
+    config = load_env_config()
+    missing = [
+        key
+        for key in ("REDDIT_CLIENT_ID", "REDDIT_CLIENT_SECRET", "REDDIT_USER_AGENT")
+        if not config.get(key)
+    ]
+    if missing:
+        print("Missing Reddit credentials: " + ", ".join(missing) + ".")
+        return 1
+
+    since_utc = _parse_since(args)
+    init_db_if_missing()
+    conn = get_connection()
+    run_id = str(uuid.uuid4())
+    started_at = time.time()
+
+    conn.execute(
+        """
+        INSERT INTO runs (
+            run_id,
+            started_at_utc,
+            status,
+            source,
+            threads_fetched,
+            comments_fetched,
+            threads_new,
+            threads_updated,
+            rule_hits,
+            genai_calls,
+            threads_flagged
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (run_id, int(started_at), "running", "backfill", 0, 0, 0, 0, 0, 0, 0),
+    )
+    conn.commit()
+
+    totals = {
+        "threads_fetched": 0,
+        "comments_fetched": 0,
+        "threads_new": 0,
+        "threads_updated": 0,
+        "threads_skipped": 0,
+    }
+    status = "success"
+    error_summary = None
+    fetch_timer = FetchTimer()
+    rate_limiter = None
+    try:
+        from collectors.reddit_client import build_reddit_client
+
+        config_snapshot = get_config_snapshot(conn)
+        subreddits = args.subreddit or [
+            str(item)
+            for item in config_snapshot.get_list("subreddits")
+            if str(item).strip()
+        ]
+        active_window_days = config_snapshot.rule_config()["active_window_days"]
+        reddit = build_reddit_client(config)
+        rate_limiter = RateGovernor(
+            limits=lambda: reddit.auth.limits,
+            max_concurrency=args.workers,
+            max_throttle_seconds=config_snapshot.get_int("max_throttle_seconds", 300),
+        )
+
+        for subreddit_name in subreddits:
+            _backfill_subreddit(
+                conn,
+                reddit,
+                subreddit_name,
+                since_utc,
+                args,
+                rate_limiter,
+                fetch_timer,
+                active_window_days,
+                totals,
+            )
+    except RateLimitExhausted as exc:
+        # Everything up to the last checkpoint is committed; rerun to resume.
+        conn.rollback()
+        status = "partial"
+        error_summary = f"{exc} Rerun the backfill to resume."
+    except Exception as exc:
+        conn.rollback()
+        status = "failed"
+        error_summary = str(exc)
+
+    conn.execute(
+        """
+        UPDATE runs
+        SET ended_at_utc = ?,
+            status = ?,
+            threads_fetched = ?,
+            comments_fetched = ?,
+            threads_new = ?,
+            threads_updated = ?,
+            threads_skipped = ?,
+            fetch_seconds = ?,
+            throttle_seconds = ?,
+            error_summary = ?
+        WHERE run_id = ?
+        """,
+        (
+            int(time.time()),
+            status,
+            totals["threads_fetched"],
+            totals["comments_fetched"],
+            totals["threads_new"],
+            totals["threads_updated"],
+            totals["threads_skipped"],
+            round(fetch_timer.seconds, 3),
+            round(rate_limiter.throttle_seconds, 3) if rate_limiter else 0,
+            error_summary,
+            run_id,
+        ),
+    )
+    conn.commit()
+    close_connection()
+
+    elapsed = max(time.time() - started_at, 1e-6)
+    if error_summary:
+        print(f"Backfill {status}: {error_summary}")
+    print(
+        f"Backfill wrote {totals['threads_fetched']} threads and "
+        f"{totals['comments_fetched']} comments in {elapsed:.1f}s. "
+        "GenAI was skipped; run scripts/rescore_rules.py to apply the rules."
+    )
+    return 0 if status != "failed" else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
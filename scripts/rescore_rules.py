@@ -0,0 +1,288 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from itertools import repeat
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+APP_ROOT = os.path.join(REPO_ROOT, "app")
+if APP_ROOT not in sys.path:
+    sys.path.insert(0, APP_ROOT)
+
+from repo.config import (
+    get_rule_config,
+    hash_config_values,
+    list_pending_term_changes,
+    mark_term_changes_applied,
+)
+from repo.db import close_connection, get_cache_dir, get_connection
+from repo.migrate import init_db_if_missing
+from repo.threads import iter_open_thread_chunks
+from services.rules_engine import (
+    GEO_CONFIG_KEYS,
+    RULE_CONFIG_KEYS,
+    decide_watch,
+    evaluate_threads,
+    load_compiled_rules,
+    resolve_location,
+    scan_location_tokens,
+)
+
+_worker_state = {}
+
+
+def _init_worker(rules_config, config_hash, cache_dir):
+    _worker_state["rules_config"] = rules_config
+    _worker_state["rules"] = load_compiled_rules(rules_config, config_hash, cache_dir)
+
+
+def _score_chunk(chunk):
+    rules_config = _worker_state["rules_config"]
+    rules = _worker_state["rules"]
+    include_unknown = rules_config.get("include_unknown_location", True)
+
+    hits, thread_flags = evaluate_threads(chunk, rules_config, rules)
+
+    states = []
+    for thread, comments in chunk:
+        thread_pk = thread["thread_pk"]
+        texts = [thread["title"], thread["body"]]
+        texts.extend(body for _, body, _ in comments)
+        geo_tokens = scan_location_tokens(texts, rules_config, rules)
+        in_area, evidence = resolve_location(thread, geo_tokens, rules_config, rules)
+        _, should_watch = decide_watch(
+            thread_flags.get(thread_pk) or {}, in_area, include_unknown
+        )
+        last_seen_comment = max(
+            (created for _, _, created in comments if created is not None),
+            default=None,
+        )
+        states.append(
+            (
+                thread_pk,
+                thread["created_at_utc"],
+                in_area,
+                evidence,
+                json.dumps(sorted(geo_tokens)),
+                last_seen_comment,
+                should_watch,
+            )
+        )
+
+    return hits, states
+
+
+def _write_chunk(conn, run_id, now, geo_config_hash, active_window_days, result):
+    hits, states = result
+    thread_pks = [state[0] for state in states]
+    placeholders = ", ".join("?" for _ in thread_pks)
+
+    # A rescore replaces the evidence recorded under earlier keyword configs.
+    conn.execute(
+        f"DELETE FROM rule_hits WHERE thread_pk IN ({placeholders})",
+        thread_pks,
+    )
+    conn.executemany(
+        """
+        INSERT INTO rule_hits (
+            run_id,
+            thread_pk,
+            comment_pk,
+            hit_type,
+            matched_term,
+            match_context,
+            created_at_utc
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        zip(
+            repeat(run_id),
+            hits["thread_pk"],
+            hits["comment_pk"],
+            hits["hit_type"],
+            hits["matched_term"],
+            hits["match_context"],
+            repeat(now),
+        ),
+    )
+
+    payload = []
+    for (
+        thread_pk,
+        created_at_utc,
+        in_area,
+        evidence,
+        geo_tokens,
+        last_seen_comment,
+        should_watch,
+    ) in states:
+        watching = 1 if should_watch else 0
+        payload.append(
+            (
+                now,
+                last_seen_comment,
+                in_area,
+                evidence,
+                geo_tokens,
+                geo_config_hash,
+                watching,
+                watching,
+                created_at_utc + (active_window_days * 86400),
+                thread_pk,
+            )
+        )
+    # Flagged threads keep watching so GenAI still sees their new comments.
+    conn.executemany(
+        """
+        UPDATE thread_state
+        SET last_rule_check_at_utc = ?,
+            last_seen_comment_at_utc = ?,
+            in_area = ?,
+            location_evidence = ?,
+            geo_tokens = ?,
+            geo_config_hash = ?,
+            watching = CASE WHEN flagged = 1 THEN watching ELSE ? END,
+            active_until_utc = CASE
+                WHEN ? = 1 AND COALESCE(watching, 0) != 1 THEN ?
+                ELSE active_until_utc
+            END
+        WHERE thread_pk = ?
+        """,
+        payload,
+    )
+    conn.commit()
+    return len(hits["thread_pk"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-apply the current keyword rules to every open thread."
+    )
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    init_db_if_missing()
+    conn = get_connection()
+    run_id = str(uuid.uuid4())
+    started_at = time.time()
+    now = int(started_at)
+
+    conn.execute(
+        """
+        INSERT INTO runs (
+            run_id,
+            started_at_utc,
+            status,
+            source,
+            threads_fetched,
+            comments_fetched,
+            threads_new,
+            threads_updated,
+            rule_hits,
+            genai_calls,
+            threads_flagged
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (run_id, now, "running", "rescore", 0, 0, 0, 0, 0, 0, 0),
+    )
+    conn.commit()
+
+    threads_rescored = 0
+    rule_hits_total = 0
+    try:
+        # Taken before the config is read: the rescore covers these changes,
+        # while changes logged after this point stay pending for the next run.
+        pending_changes = list_pending_term_changes(conn)
+        rules_config = get_rule_config(conn)
+        config_hash = hash_config_values(conn, RULE_CONFIG_KEYS)
+        geo_config_hash = hash_config_values(conn, GEO_CONFIG_KEYS)
+        cache_dir = get_cache_dir("rules")
+        active_window_days = rules_config["active_window_days"]
+        # Compile (and cache on disk) once so workers only load the pickle.
+        load_compiled_rules(rules_config, config_hash, cache_dir)
+
+        max_pending = max(1, args.workers) * 2
+        with multiprocessing.Pool(
+            processes=max(1, args.workers),
+            initializer=_init_worker,
+            initargs=(rules_config, config_hash, cache_dir),
+        ) as pool:
+            pending = deque()
+
+            def drain_one():
+                nonlocal threads_rescored, rule_hits_total
+                result = pending.popleft().get()
+                rule_hits_total += _write_chunk(
+                    conn, run_id, now, geo_config_hash, active_window_days, result
+                )
+                threads_rescored += len(result[1])
+                elapsed = max(time.time() - started_at, 1e-6)
+                print(
+                    f"Rescored {threads_rescored} threads "
+                    f"({threads_rescored / elapsed:.1f} threads/s)."
+                )
+
+            for chunk in iter_open_thread_chunks(conn, args.chunk_size):
+                pending.append(pool.apply_async(_score_chunk, (chunk,)))
+                if len(pending) >= max_pending:
+                    drain_one()
+            while pending:
+                drain_one()
+
+        conn.execute(
+            """
+            UPDATE runs
+            SET ended_at_utc = ?,
+                status = ?,
+                threads_updated = ?,
+                rule_hits = ?
+            WHERE run_id = ?
+            """,
+            (int(time.time()), "success", threads_rescored, rule_hits_total, run_id),
+        )
+        if pending_changes:
+            mark_term_changes_applied(
+                conn, pending_changes[-1]["change_pk"], int(time.time())
+            )
+        conn.commit()
+    except Exception as exc:
+        conn.rollback()
+        conn.execute(
+            """
+            UPDATE runs
+            SET ended_at_utc = ?,
+                status = ?,
+                threads_updated = ?,
+                rule_hits = ?,
+                error_summary = ?
+            WHERE run_id = ?
+            """,
+            (
+                int(time.time()),
+                "failed",
+                threads_rescored,
+                rule_hits_total,
+                str(exc),
+                run_id,
+            ),
+        )
+        conn.commit()
+        print(f"Rescore failed: {exc}")
+        return 1
+    finally:
+        close_connection()
+
+    elapsed = max(time.time() - started_at, 1e-6)
+    print(
+        f"Rescore complete: {threads_rescored} threads, {rule_hits_total} rule hits "
+        f"in {elapsed:.1f}s ({threads_rescored / elapsed:.1f} threads/s)."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
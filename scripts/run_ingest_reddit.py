@@ -1,92 +1,119 @@
+import argparse
+import json
 import os
 import sys
 import time
 import uuid
+from functools import partial
+from itertools import islice, repeat
 
 REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 APP_ROOT = os.path.join(REPO_ROOT, "app")
 if APP_ROOT not in sys.path:
     sys.path.insert(0, APP_ROOT)
 
-from collectors.reddit_collector import fetch_comments, fetch_threads
+from collectors.rate_limit import RateGovernor, RateLimitExhausted
+from collectors.replay import RecordingReddit, ReplayReddit
+from collectors.reddit_collector import (
+    FetchTimer,
+    fetch_known_submissions,
+    fetch_subreddit_batches,
+    prefetch_comment_forests,
+)
 from config import load_env_config
 from repo.config import (
-    get_config_bool,
-    get_config_dict,
-    get_config_int,
-    get_config_list,
-    get_config_value,
-    parse_config_json,
+    get_config_snapshot,
+    list_pending_term_changes,
+    mark_term_changes_applied,
+)
+from repo.db import close_connection, get_cache_dir, get_connection
+from repo.ingest import (
+    get_subreddit_cursors,
+    get_thread_versions,
+    list_active_source_thread_ids,
+    upsert_comments,
+    upsert_subreddit_cursor,
+    upsert_threads,
 )
-from repo.db import connect
-from repo.ingest import ensure_thread_state, upsert_comments, upsert_thread
 from repo.genai import insert_detections, insert_draft_response, insert_genai_eval
 from repo.migrate import init_db_if_missing
+from repo.search import fts_available, fts_match_any, match_comment_pks
+from repo.runs import (
+    add_run_threads,
+    add_unchecked_run_threads,
+    get_run,
+    get_run_thread_results,
+    list_run_source_thread_ids,
+    list_run_thread_pks,
+    save_run_checkpoint,
+    set_run_thread_results,
+)
 from repo.threads import (
-    get_comment_pk_by_source_id,
-    get_comment_source_id,
-    list_comments_for_thread,
-    list_comments_since,
+    get_comment_pks_by_source_ids,
+    iter_open_thread_chunks,
     list_rule_hits_for_run,
+    load_comment_slices,
+    load_threads_with_state,
+)
+from services.normalize_reddit import (
+    needs_comment_fetch,
+    normalize_comments,
+    normalize_submission,
 )
-from services.normalize_reddit import normalize_comment, normalize_submission
 from services.genai_evaluator import (
     MODEL_NAME,
     PROMPT_VERSION,
     build_genai_payload,
     call_genai,
+    call_genai_offline,
+)
+from services.rules_engine import (
+    GEO_CONFIG_KEYS,
+    RULE_CONFIG_KEYS,
+    TERM_LISTS,
+    compile_rules,
+    decide_watch,
+    evaluate_batch,
+    evaluate_threads,
+    load_compiled_rules,
+    prefilter_literals,
+    resolve_location,
+    scan_location_tokens,
 )
-from services.rules_engine import evaluate_comment, evaluate_thread, infer_location
 
+INGEST_BATCH_SIZE = 100
+RULES_CHUNK_SIZE = 500
+GENAI_CHUNK_SIZE = 20
+# Each literal is its own FTS lookup; past roughly this many, matching the
+# comments in Python is cheaper than asking the index which ones could match.
+FTS_PREFILTER_MAX_TERMS = 100
+RUN_STAGES = ("ingest", "refresh", "rules", "genai", "done")
+RUN_COUNTERS = (
+    "threads_fetched",
+    "comments_fetched",
+    "threads_new",
+    "threads_updated",
+    "threads_skipped",
+    "rule_hits",
+    "genai_calls",
+    "threads_flagged",
+)
 
-def _get_subreddits(conn):
-    raw_value = get_config_value(conn, "subreddits")
-    parsed = parse_config_json(raw_value)
-    if isinstance(parsed, list) and parsed:
-        return [str(item) for item in parsed if str(item).strip()]
 
-    return ["Atlanta"]
+def _get_subreddits(config_snapshot):
+    subreddits = config_snapshot.get_list("subreddits")
+    if subreddits:
+        return [str(item) for item in subreddits if str(item).strip()]
 
-
-def _get_rule_config(conn):
-    return {
-        "keywords_include": get_config_list(conn, "keywords_include", []),
-        "keywords_intent": get_config_list(conn, "keywords_intent", []),
-        "keywords_negative": get_config_list(conn, "keywords_negative", []),
-        "include_unknown_location": get_config_bool(
-            conn, "include_unknown_location", True
-        ),
-        "active_window_days": get_config_int(conn, "active_window_days", 5),
-        "geo_service_area": get_config_list(conn, "geo_service_area", []),
-        "subreddit_geo_map": get_config_dict(conn, "subreddit_geo_map", {}),
-        "geo_out_of_area": get_config_list(conn, "geo_out_of_area", []),
-    }
+    return ["Atlanta"]
 
 
-def _get_genai_config(conn):
-    return {
-        "max_genai_evals_per_thread": get_config_int(
-            conn, "max_genai_evals_per_thread", 5
-        ),
-        "genai_cooldown_minutes": get_config_int(
-            conn, "genai_cooldown_minutes", 120
-        ),
-        "delta_min_new_comments": get_config_int(
-            conn, "delta_min_new_comments", 1
-        ),
-        "max_delta_comments_sent": get_config_int(
-            conn, "max_delta_comments_sent", 25
-        ),
-        "business_context": get_config_dict(
-            conn,
-            "business_context",
-            {
-                "service": "local service",
-                "service_area": "unspecified",
-                "tone": "helpful",
-            },
-        ),
-    }
+def _load_rules(config_snapshot):
+    return load_compiled_rules(
+        config_snapshot.rule_config(),
+        config_snapshot.hash_values(RULE_CONFIG_KEYS),
+        get_cache_dir("rules"),
+    )
 
 
 def _validate_reddit_config(config):
@@ -99,93 +126,215 @@ def _validate_reddit_config(config):
     return missing
 
 
-def _run_rules_for_threads(conn, run_id, thread_pks, rules_config):
+def _ingest_chunk(
+    conn, submissions, active_window_days, rate_limiter, comment_workers, timer
+):
+    # One bulk version lookup and one bulk upsert per chunk; comment forests
+    # are then prefetched on workers while this thread writes them.
+    now = int(time.time())
+    threads = [normalize_submission(submission, now) for submission in submissions]
+    previous = get_thread_versions(
+        conn, "reddit", [thread.source_thread_id for thread in threads]
+    )
+    thread_pks, threads_new = upsert_threads(conn, threads, active_window_days)
+
+    by_id = {
+        submission.id: (thread_pk, thread)
+        for submission, thread_pk, thread in zip(submissions, thread_pks, threads)
+    }
+    stats = {"threads_new": threads_new, "threads_skipped": 0, "comments": 0}
+    for submission, comments in prefetch_comment_forests(
+        (
+            (
+                submission,
+                needs_comment_fetch(previous.get(thread.source_thread_id), thread),
+            )
+            for submission, thread in zip(submissions, threads)
+        ),
+        rate_limiter,
+        max_workers=comment_workers,
+        timer=timer,
+    ):
+        if comments is None:
+            stats["threads_skipped"] += 1
+            continue
+        thread_pk, thread = by_id[submission.id]
+        stats["comments"] += upsert_comments(
+            conn,
+            normalize_comments(comments, thread_pk, thread.source_thread_id, now),
+        )
+    return thread_pks, stats
+
+
+def _run_rules_for_threads(
+    conn, run_id, thread_pks, rules_config, rules, geo_config_hash
+):
     now = int(time.time())
-    rule_hits_count = 0
     include_unknown = rules_config.get("include_unknown_location", True)
     active_window_days = rules_config.get("active_window_days", 5)
     thread_results = {}
 
-    for thread_pk in thread_pks:
-        thread = conn.execute(
-            "SELECT * FROM threads WHERE thread_pk = ?",
-            (thread_pk,),
-        ).fetchone()
-        thread_state = conn.execute(
-            "SELECT * FROM thread_state WHERE thread_pk = ?",
-            (thread_pk,),
-        ).fetchone()
-        if thread is None or thread_state is None:
-            continue
-        if thread_state["closed"] == 1 or thread_state["dismissed"] == 1:
-            continue
+    comment_pks = []
+    comment_thread_pks = []
+    bodies = []
+    contexts = []
+    evaluated = []
+
+    contexts_by_thread = load_threads_with_state(conn, thread_pks)
+    open_threads = [
+        contexts_by_thread[thread_pk]
+        for thread_pk in dict.fromkeys(thread_pks)
+        if thread_pk in contexts_by_thread
+        and contexts_by_thread[thread_pk]["closed"] != 1
+        and contexts_by_thread[thread_pk]["dismissed"] != 1
+    ]
+    # Threads whose geo tokens are stale need every comment re-scanned;
+    # the rest only need comments since the last rules check.
+    comment_slices = load_comment_slices(
+        conn,
+        {
+            thread["thread_pk"]: (
+                thread["last_rule_check_at_utc"]
+                if thread["geo_config_hash"] == geo_config_hash
+                else None
+            )
+            for thread in open_threads
+        },
+    )
+
+    for thread in open_threads:
+        thread_pk = thread["thread_pk"]
+        thread_state = thread
+        thread_comments = comment_slices[thread_pk]
 
         last_rule_check = thread_state["last_rule_check_at_utc"]
         if last_rule_check:
-            comments = list_comments_since(conn, thread_pk, last_rule_check)
-            if not comments:
+            comments = [
+                comment
+                for comment in thread_comments
+                if comment["created_at_utc"] is not None
+                and comment["created_at_utc"] > last_rule_check
+            ]
+            # A geo config change still needs the location recomputed.
+            if not comments and thread_state["geo_config_hash"] == geo_config_hash:
                 thread_results[thread_pk] = {
                     "positive_hit": False,
                     "rule_hit_count": 0,
                     "in_area": thread_state["in_area"],
                 }
                 continue
-            hits = []
-            for comment in comments:
-                hits.extend(evaluate_comment(comment, rules_config))
         else:
-            comments = list_comments_for_thread(conn, thread_pk)
-            hits = evaluate_thread(thread, comments, rules_config)
-
-        in_area, evidence = infer_location(thread, comments, rules_config)
-        has_negative = any(hit["hit_type"] == "negative" for hit in hits)
-        has_service = any(hit["hit_type"] == "keyword" for hit in hits)
-        has_intent = any(hit["hit_type"] == "phrase" for hit in hits)
-
-        positive_hit = (not has_negative) and has_service and has_intent
-        should_watch = positive_hit
-        if in_area == "false":
-            should_watch = False
-        elif in_area == "unknown" and not include_unknown:
-            should_watch = False
-
-        if hits:
-            payload = []
-            for hit in hits:
-                payload.append(
-                    (
-                        run_id,
-                        thread_pk,
-                        hit.get("comment_pk"),
-                        hit["hit_type"],
-                        hit["matched_term"],
-                        hit["match_context"],
-                        now,
-                    )
-                )
-            conn.executemany(
-                """
-                INSERT INTO rule_hits (
-                    run_id,
-                    thread_pk,
-                    comment_pk,
-                    hit_type,
-                    matched_term,
-                    match_context,
-                    created_at_utc
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                payload,
-            )
-            rule_hits_count += len(payload)
-
-        last_seen_comment = None
-        if comments:
-            last_seen_comment = max(
+            comments = thread_comments
+            for context in ("title", "body"):
+                comment_pks.append(None)
+                comment_thread_pks.append(thread_pk)
+                bodies.append(thread[context] or "")
+                contexts.append(context)
+
+        for comment in comments:
+            comment_pks.append(comment["comment_pk"])
+            comment_thread_pks.append(thread_pk)
+            bodies.append(comment["body"] or "")
+            contexts.append("comment")
+
+        # Geo tokens accumulate across runs; only new comments need scanning
+        # unless the geo config changed since the tokens were recorded.
+        known_tokens = None
+        geo_comments = comments
+        if last_rule_check:
+            if thread_state["geo_config_hash"] == geo_config_hash:
+                known_tokens = json.loads(thread_state["geo_tokens"] or "[]")
+            else:
+                geo_comments = thread_comments
+        geo_texts = [thread["title"] or "", thread["body"] or ""]
+        geo_texts.extend(comment["body"] or "" for comment in geo_comments)
+        geo_tokens = scan_location_tokens(
+            geo_texts, rules_config, rules, found=known_tokens
+        )
+        in_area, evidence = resolve_location(thread, geo_tokens, rules_config, rules)
+        last_seen_comment = max(
+            (
                 comment["created_at_utc"]
                 for comment in comments
                 if comment["created_at_utc"] is not None
+            ),
+            default=thread_state["last_seen_comment_at_utc"],
+        )
+        evaluated.append(
+            (
+                thread_pk,
+                thread,
+                thread_state,
+                in_area,
+                evidence,
+                json.dumps(sorted(geo_tokens)),
+                last_seen_comment,
             )
+        )
+
+    literals = prefilter_literals(rules) if fts_available(conn) else None
+    candidates = None
+    if literals is not None and len(literals) <= FTS_PREFILTER_MAX_TERMS:
+        candidates = match_comment_pks(
+            conn, literals, [pk for pk in comment_pks if pk is not None]
+        )
+    if candidates is not None:
+        # Skip comments the index says contain none of the terms; titles and
+        # bodies are few and always matched.
+        kept = [
+            index
+            for index, comment_pk in enumerate(comment_pks)
+            if comment_pk is None or comment_pk in candidates
+        ]
+        comment_pks = [comment_pks[index] for index in kept]
+        comment_thread_pks = [comment_thread_pks[index] for index in kept]
+        bodies = [bodies[index] for index in kept]
+        contexts = [contexts[index] for index in kept]
+
+    hits, thread_flags = evaluate_batch(
+        comment_pks,
+        comment_thread_pks,
+        bodies,
+        rules_config,
+        rules,
+        contexts=contexts,
+    )
+    rule_hits_count = len(hits["thread_pk"])
+    if rule_hits_count:
+        conn.executemany(
+            """
+            INSERT INTO rule_hits (
+                run_id,
+                thread_pk,
+                comment_pk,
+                hit_type,
+                matched_term,
+                match_context,
+                created_at_utc
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            zip(
+                repeat(run_id),
+                hits["thread_pk"],
+                hits["comment_pk"],
+                hits["hit_type"],
+                hits["matched_term"],
+                hits["match_context"],
+                repeat(now),
+            ),
+        )
+
+    for (
+        thread_pk,
+        thread,
+        thread_state,
+        in_area,
+        evidence,
+        geo_tokens,
+        last_seen_comment,
+    ) in evaluated:
+        flags = thread_flags.get(thread_pk) or {}
+        positive_hit, should_watch = decide_watch(flags, in_area, include_unknown)
 
         conn.execute(
             """
@@ -193,10 +342,20 @@ def _run_rules_for_threads(conn, run_id, thread_pks, rules_config):
             SET last_rule_check_at_utc = ?,
                 last_seen_comment_at_utc = ?,
                 in_area = ?,
-                location_evidence = ?
+                location_evidence = ?,
+                geo_tokens = ?,
+                geo_config_hash = ?
             WHERE thread_pk = ?
             """,
-            (now, last_seen_comment, in_area, evidence, thread_pk),
+            (
+                now,
+                last_seen_comment,
+                in_area,
+                evidence,
+                geo_tokens,
+                geo_config_hash,
+                thread_pk,
+            ),
         )
 
         if (
@@ -217,13 +376,147 @@ def _run_rules_for_threads(conn, run_id, thread_pks, rules_config):
 
         thread_results[thread_pk] = {
             "positive_hit": positive_hit,
-            "rule_hit_count": len(hits),
+            "rule_hit_count": flags.get("hit_count", 0),
             "in_area": in_area,
         }
 
     return rule_hits_count, thread_results
 
 
+def _apply_term_changes(conn, run_id, rules_config, chunk_size=500):
+    changes = list_pending_term_changes(conn)
+    if not changes:
+        return 0
+
+    now = int(time.time())
+    include_unknown = rules_config.get("include_unknown_location", True)
+    active_window_days = rules_config.get("active_window_days", 5)
+    hit_types = dict(TERM_LISTS)
+
+    net_changes = {}
+    for change in changes:
+        if change["config_key"] in hit_types:
+            net_changes[(change["config_key"], change["term"])] = change["change_type"]
+
+    # Drop hits for every changed term; re-added terms are rescanned below.
+    affected = set()
+    added_config = {config_key: [] for config_key in hit_types}
+    for (config_key, term), change_type in net_changes.items():
+        rows = conn.execute(
+            """
+            DELETE FROM rule_hits
+            WHERE hit_type = ? AND matched_term = ?
+            RETURNING thread_pk
+            """,
+            (hit_types[config_key], term),
+        ).fetchall()
+        affected.update(row["thread_pk"] for row in rows)
+        if change_type == "added":
+            added_config[config_key].append(term)
+
+    # Only comments already rule-checked need the new terms; anything newer is
+    # picked up by the regular rules stage with the full config.
+    rule_hits_count = 0
+    if any(added_config.values()):
+        added_rules = compile_rules(added_config)
+        # The index narrows the rescan to threads that can contain a new term.
+        literals = None
+        if fts_available(conn):
+            literals = prefilter_literals(added_rules)
+        match = fts_match_any(literals) if literals else None
+        for chunk in iter_open_thread_chunks(
+            conn, chunk_size, checked_only=True, match=match
+        ):
+            hits, thread_flags = evaluate_threads(chunk, added_config, added_rules)
+            if not hits["thread_pk"]:
+                continue
+            conn.executemany(
+                """
+                INSERT INTO rule_hits (
+                    run_id,
+                    thread_pk,
+                    comment_pk,
+                    hit_type,
+                    matched_term,
+                    match_context,
+                    created_at_utc
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                zip(
+                    repeat(run_id),
+                    hits["thread_pk"],
+                    hits["comment_pk"],
+                    hits["hit_type"],
+                    hits["matched_term"],
+                    hits["match_context"],
+                    repeat(now),
+                ),
+            )
+            rule_hits_count += len(hits["thread_pk"])
+            affected.update(
+                thread_pk
+                for thread_pk, flags in thread_flags.items()
+                if flags["hit_count"]
+            )
+
+    affected = sorted(affected)
+    for start in range(0, len(affected), chunk_size):
+        thread_pks = affected[start : start + chunk_size]
+        placeholders = ", ".join("?" for _ in thread_pks)
+        rows = conn.execute(
+            f"""
+            SELECT
+                ts.thread_pk,
+                ts.in_area,
+                t.created_at_utc,
+                COALESCE(MAX(rh.hit_type = 'keyword'), 0) AS has_service,
+                COALESCE(MAX(rh.hit_type = 'phrase'), 0) AS has_intent,
+                COALESCE(MAX(rh.hit_type = 'negative'), 0) AS has_negative
+            FROM thread_state AS ts
+            JOIN threads AS t ON t.thread_pk = ts.thread_pk
+            LEFT JOIN rule_hits AS rh ON rh.thread_pk = ts.thread_pk
+            WHERE ts.thread_pk IN ({placeholders})
+                AND COALESCE(ts.closed, 0) = 0
+                AND COALESCE(ts.dismissed, 0) = 0
+            GROUP BY ts.thread_pk
+            """,
+            thread_pks,
+        ).fetchall()
+        payload = []
+        for row in rows:
+            flags = {
+                "has_service": row["has_service"] == 1,
+                "has_intent": row["has_intent"] == 1,
+                "has_negative": row["has_negative"] == 1,
+            }
+            _, should_watch = decide_watch(flags, row["in_area"], include_unknown)
+            watching = 1 if should_watch else 0
+            payload.append(
+                (
+                    watching,
+                    watching,
+                    row["created_at_utc"] + (active_window_days * 86400),
+                    row["thread_pk"],
+                )
+            )
+        # Flagged threads keep watching so GenAI still sees their new comments.
+        conn.executemany(
+            """
+            UPDATE thread_state
+            SET watching = CASE WHEN flagged = 1 THEN watching ELSE ? END,
+                active_until_utc = CASE
+                    WHEN ? = 1 AND COALESCE(watching, 0) != 1 THEN ?
+                    ELSE active_until_utc
+                END
+            WHERE thread_pk = ?
+            """,
+            payload,
+        )
+
+    mark_term_changes_applied(conn, changes[-1]["change_pk"], now)
+    return rule_hits_count
+
+
 def _select_delta_comments(comments, thread_author, max_count):
     op_comments = [
         comment
@@ -261,37 +554,37 @@ def _build_rule_evidence(conn, thread_pk, run_id):
     hits = list_rule_hits_for_run(conn, thread_pk, run_id)
     payload = []
     for hit in hits:
-        comment_id = None
-        if hit["comment_pk"] is not None:
-            comment_id = get_comment_source_id(conn, hit["comment_pk"])
         payload.append(
             {
                 "matched_term": hit["matched_term"],
                 "hit_type": hit["hit_type"],
                 "match_context": hit["match_context"],
-                "comment_id": comment_id,
+                "comment_id": hit["source_comment_id"],
             }
         )
     return payload
 
 
 def _run_genai_for_threads(
-    conn, run_id, thread_pks, rules_config, genai_config, api_key, rule_results
+    conn,
+    run_id,
+    thread_pks,
+    rules_config,
+    genai_config,
+    api_key,
+    rule_results,
+    genai_call=call_genai,
 ):
     now = int(time.time())
     genai_calls = 0
     threads_flagged = 0
 
-    for thread_pk in thread_pks:
-        thread = conn.execute(
-            "SELECT * FROM threads WHERE thread_pk = ?",
-            (thread_pk,),
-        ).fetchone()
-        thread_state = conn.execute(
-            "SELECT * FROM thread_state WHERE thread_pk = ?",
-            (thread_pk,),
-        ).fetchone()
-        if thread is None or thread_state is None:
+    # State is loaded after the rules stage has written in_area and watching.
+    contexts_by_thread = load_threads_with_state(conn, thread_pks)
+    candidates = []
+    for thread_pk in dict.fromkeys(thread_pks):
+        thread_state = contexts_by_thread.get(thread_pk)
+        if thread_state is None:
             continue
         if thread_state["closed"] == 1 or thread_state["dismissed"] == 1:
             continue
@@ -315,11 +608,21 @@ def _run_genai_for_threads(
             cooldown_seconds = genai_config["genai_cooldown_minutes"] * 60
             if now - last_genai_eval < cooldown_seconds:
                 continue
+        candidates.append(thread_state)
+
+    comment_slices = load_comment_slices(
+        conn,
+        {
+            thread_state["thread_pk"]: thread_state["last_genai_eval_at_utc"] or None
+            for thread_state in candidates
+        },
+    )
 
-        if last_genai_eval:
-            delta_comments = list_comments_since(conn, thread_pk, last_genai_eval)
-        else:
-            delta_comments = list_comments_for_thread(conn, thread_pk)
+    for thread in candidates:
+        thread_pk = thread["thread_pk"]
+        thread_state = thread
+        last_genai_eval = thread_state["last_genai_eval_at_utc"]
+        delta_comments = comment_slices[thread_pk]
 
         delta_min = genai_config["delta_min_new_comments"]
         trigger_a = (
@@ -360,10 +663,10 @@ def _run_genai_for_threads(
         tokens_out = None
         status = "success"
         try:
-            result, tokens_in, tokens_out = call_genai(payload, api_key)
+            result, tokens_in, tokens_out = genai_call(payload, api_key)
         except Exception as exc:
             try:
-                result, tokens_in, tokens_out = call_genai(payload, api_key)
+                result, tokens_in, tokens_out = genai_call(payload, api_key)
             except Exception as retry_exc:
                 status = "failed"
                 error_text = str(retry_exc)
@@ -426,16 +729,19 @@ def _run_genai_for_threads(
                 now,
             )
 
+            detection_items = result.get("detection_items", [])
+            comment_ids = [
+                str(item["comment_id"]) if item.get("comment_id") else None
+                for item in detection_items
+            ]
+            comment_pks = get_comment_pks_by_source_ids(
+                conn, thread_pk, filter(None, comment_ids)
+            )
             detection_payload = []
-            for item in result.get("detection_items", []):
-                comment_pk = None
-                if item.get("comment_id"):
-                    comment_pk = get_comment_pk_by_source_id(
-                        conn, thread_pk, item["comment_id"]
-                    )
+            for item, comment_id in zip(detection_items, comment_ids):
                 detection_payload.append(
                     {
-                        "comment_pk": comment_pk,
+                        "comment_pk": comment_pks.get(comment_id),
                         "detection_type": item.get("detection_type"),
                         "evidence_text": item.get("evidence_excerpt"),
                         "source_hash": None,
@@ -453,46 +759,129 @@ def _run_genai_for_threads(
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Ingest Reddit threads.")
+    parser.add_argument(
+        "--record", help="Write every fetched submission and comment to this .jsonl.gz."
+    )
+    parser.add_argument(
+        "--replay", help="Serve Reddit from a recording instead of the live API."
+    )
+    parser.add_argument(
+        "--replay-speedup",
+        type=float,
+        default=1.0,
+        help="Divide recorded latencies by this factor; 0 disables the delays.",
+    )
+    parser.add_argument(
+        "--replay-scale",
+        type=int,
+        default=1,
+        help="Clone every recorded submission and comment this many times.",
+    )
+    parser.add_argument(
+        "--offline-genai",
+        action="store_true",
+        help="Use a deterministic local stand-in for the OpenAI call.",
+    )
+    parser.add_argument("--genai-latency", type=float, default=0.0)
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="Continue an interrupted run from its last checkpoint.",
+    )
+    args = parser.parse_args()
+
     config = load_env_config()
     init_db_if_missing()
-    conn = connect()
-    run_id = str(uuid.uuid4())
-    started_at = int(time.time())
+    conn = get_connection()
+    timer_start = time.perf_counter()
+    stage_seconds = {}
     error_messages = []
+    totals = dict.fromkeys(RUN_COUNTERS, 0)
+    previous_seconds = {"fetch_seconds": 0, "throttle_seconds": 0}
+
+    if args.resume:
+        run = get_run(conn, args.resume)
+        if run is None:
+            print(f"No run {args.resume} to resume.")
+            close_connection()
+            return 1
+        if run["checkpoint_stage"] == "done":
+            print(f"Run {args.resume} already finished ({run['status']}).")
+            close_connection()
+            return 0
+        run_id = run["run_id"]
+        resume_stage = run["checkpoint_stage"] or "ingest"
+        resume_subreddit = run["checkpoint_subreddit"]
+        resume_thread_pk = run["checkpoint_thread_pk"]
+        totals.update({key: run[key] or 0 for key in RUN_COUNTERS})
+        previous_seconds.update(
+            {key: run[key] or 0 for key in previous_seconds}
+        )
+        conn.execute(
+            """
+            UPDATE runs
+            SET status = ?,
+                ended_at_utc = NULL,
+                error_summary = NULL
+            WHERE run_id = ?
+            """,
+            ("running", run_id),
+        )
+        print(f"Resuming run {run_id} at the {resume_stage} stage.")
+    else:
+        run_id = str(uuid.uuid4())
+        resume_stage = "ingest"
+        resume_subreddit = None
+        resume_thread_pk = None
+        conn.execute(
+            """
+            INSERT INTO runs (
+                run_id,
+                started_at_utc,
+                status,
+                source,
+                threads_fetched,
+                comments_fetched,
+                threads_new,
+                threads_updated,
+                rule_hits,
+                genai_calls,
+                threads_flagged
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                run_id,
+                int(time.time()),
+                "running",
+                "replay" if args.replay else "reddit",
+                0,
+                0,
+                0,
+                0,
+                0,
+                0,
+                0,
+            ),
+        )
+    conn.commit()
 
-    conn.execute(
-        """
-        INSERT INTO runs (
-            run_id,
-            started_at_utc,
-            status,
-            source,
-            threads_fetched,
-            comments_fetched,
-            threads_new,
-            threads_updated,
-            rule_hits,
-            genai_calls,
-            threads_flagged
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
+    def reached(stage):
+        return RUN_STAGES.index(resume_stage) <= RUN_STAGES.index(stage)
+
+    def checkpoint(stage, subreddit=None, thread_pk=None):
+        save_run_checkpoint(
+            conn,
             run_id,
-            started_at,
-            "running",
-            "reddit",
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-        ),
-    )
-    conn.commit()
+            stage,
+            totals,
+            int(time.time()),
+            subreddit=subreddit,
+            thread_pk=thread_pk,
+        )
+        conn.commit()
 
-    missing = _validate_reddit_config(config)
+    missing = [] if args.replay else _validate_reddit_config(config)
     if missing:
         error_messages.append(
             "Missing Reddit credentials: " + ", ".join(missing) + "."
@@ -509,118 +898,219 @@ def main():
         )
         conn.commit()
         print(" ".join(error_messages) + " Skipping ingestion.")
-        conn.close()
+        close_connection()
         return 0
 
+    reddit = None
     try:
         from collectors.reddit_client import build_reddit_client
 
-        subreddits = _get_subreddits(conn)
-        rules_config = _get_rule_config(conn)
-        genai_config = _get_genai_config(conn)
+        config_snapshot = get_config_snapshot(conn)
+        subreddits = _get_subreddits(config_snapshot)
+        rules_config = config_snapshot.rule_config()
+        genai_config = config_snapshot.genai_config()
         active_window_days = rules_config["active_window_days"]
 
-        reddit = build_reddit_client(config)
-        submissions = fetch_threads(reddit, subreddits, limit=25)
-
-        threads_fetched = 0
-        comments_fetched = 0
-        threads_new = 0
-        threads_updated = 0
-        rule_hits_total = 0
-        ingested_thread_pks = []
-
-        for submission in submissions:
-            threads_fetched += 1
-            thread_dict = normalize_submission(submission)
-            existing = conn.execute(
-                """
-                SELECT thread_pk
-                FROM threads
-                WHERE source = ? AND source_thread_id = ?
-                """,
-                (thread_dict["source"], thread_dict["source_thread_id"]),
-            ).fetchone()
-
-            thread_pk = upsert_thread(conn, thread_dict)
-            if existing is None:
-                threads_new += 1
-            else:
-                threads_updated += 1
-
-            ensure_thread_state(
-                conn,
-                thread_pk,
-                thread_dict["created_at_utc"],
-                active_window_days=active_window_days,
+        if args.replay:
+            # Recorded latencies stand in for the API, so no client-side limit.
+            reddit = ReplayReddit(
+                args.replay, speedup=args.replay_speedup, scale=args.replay_scale
             )
-
-            comment_rows = fetch_comments(submission)
-            normalized_comments = [
-                normalize_comment(comment, thread_pk, thread_dict["source_thread_id"])
-                for comment in comment_rows
-            ]
-            comments_fetched += upsert_comments(conn, thread_pk, normalized_comments)
-            ingested_thread_pks.append(thread_pk)
-
-        rule_hits_total, rule_results = _run_rules_for_threads(
-            conn, run_id, ingested_thread_pks, rules_config
+            rate_limiter = None
+        else:
+            reddit = build_reddit_client(config)
+        if args.record:
+            reddit = RecordingReddit(reddit, args.record)
+        cursors = get_subreddit_cursors(conn)
+        fetch_workers = config_snapshot.get_int("fetch_workers", 4)
+        comment_workers = config_snapshot.get_int("comment_workers", 4)
+        if not args.replay:
+            rate_limiter = RateGovernor(
+                limits=lambda: reddit.auth.limits,
+                max_concurrency=max(fetch_workers, comment_workers),
+                max_throttle_seconds=config_snapshot.get_int(
+                    "max_throttle_seconds", 300
+                ),
+            )
+        fetch_timer = FetchTimer()
+
+        # A resumed run skips the subreddits it already finished.
+        pending_subreddits = []
+        if resume_stage == "ingest":
+            pending_subreddits = list(subreddits)
+            if resume_subreddit in pending_subreddits:
+                pending_subreddits = pending_subreddits[
+                    pending_subreddits.index(resume_subreddit) + 1 :
+                ]
+        batches = fetch_subreddit_batches(
+            reddit,
+            pending_subreddits,
+            # A scaled replay clones each listing item, so widen the window to match.
+            limit=25 * (args.replay_scale if args.replay else 1),
+            max_workers=fetch_workers,
+            rate_limiter=rate_limiter,
+            cursors=cursors,
+            timer=fetch_timer,
         )
 
-        genai_calls = 0
-        threads_flagged = 0
-        if not config.get("OPENAI_API_KEY"):
+        def ingest(submissions, stage, subreddit=None):
+            submissions = iter(submissions)
+            while True:
+                chunk = list(islice(submissions, INGEST_BATCH_SIZE))
+                if not chunk:
+                    return
+                thread_pks, stats = _ingest_chunk(
+                    conn,
+                    chunk,
+                    active_window_days,
+                    rate_limiter,
+                    comment_workers,
+                    fetch_timer,
+                )
+                add_run_threads(conn, run_id, thread_pks)
+                totals["threads_fetched"] += len(chunk)
+                totals["threads_new"] += stats["threads_new"]
+                totals["threads_updated"] += len(chunk) - stats["threads_new"]
+                totals["threads_skipped"] += stats["threads_skipped"]
+                totals["comments_fetched"] += stats["comments"]
+                # Commit each chunk whole, so a thread's new comment count is
+                # never stored without its comments; rows land while later
+                # subreddits still fetch.
+                checkpoint(stage, subreddit)
+
+        completed_subreddits = []
+        try:
+            for subreddit_name, batch, cursor in batches:
+                ingest(batch, "ingest", resume_subreddit)
+                # Advance the cursor only once its submissions are written.
+                upsert_subreddit_cursor(
+                    conn, subreddit_name, cursor, int(time.time())
+                )
+                resume_subreddit = subreddit_name
+                checkpoint("ingest", subreddit_name)
+                completed_subreddits.append(subreddit_name)
+
+            if reached("refresh"):
+                # Known threads still inside their active window are refreshed
+                # in bulk instead of being rediscovered through the listings.
+                checkpoint("refresh")
+                seen_thread_ids = set(
+                    list_run_source_thread_ids(conn, run_id, "reddit")
+                )
+                active_thread_ids = [
+                    thread_id
+                    for thread_id in list_active_source_thread_ids(
+                        conn, "reddit", subreddits, int(time.time())
+                    )
+                    if thread_id not in seen_thread_ids
+                ]
+                ingest(
+                    fetch_known_submissions(
+                        reddit, active_thread_ids, rate_limiter, timer=fetch_timer
+                    ),
+                    "refresh",
+                )
+        except RateLimitExhausted as exc:
+            # Keep what was committed and score it; the unfinished chunk is
+            # dropped, and skipped subreddits keep their cursors and are picked
+            # up by the next run.
+            conn.rollback()
+            batches.close()
+            skipped = [
+                name
+                for name in pending_subreddits
+                if name not in completed_subreddits
+            ]
+            message = f"{exc} Stopped fetching early"
+            if skipped:
+                message += "; skipped subreddits: " + ", ".join(skipped)
+            error_messages.append(message + ".")
+
+        stage_seconds["ingest"] = time.perf_counter() - timer_start
+
+        stage_start = time.perf_counter()
+        if reached("rules"):
+            after_thread_pk = resume_thread_pk if resume_stage == "rules" else None
+            rules = _load_rules(config_snapshot)
+            geo_config_hash = config_snapshot.hash_values(GEO_CONFIG_KEYS)
+            totals["rule_hits"] += _apply_term_changes(conn, run_id, rules_config)
+            if after_thread_pk is None:
+                adopted = add_unchecked_run_threads(conn, run_id)
+                if adopted:
+                    print(f"Picked up {adopted} threads left unscored by earlier runs.")
+            checkpoint("rules", thread_pk=after_thread_pk)
+            thread_pks = list_run_thread_pks(conn, run_id, after_thread_pk)
+            for start in range(0, len(thread_pks), RULES_CHUNK_SIZE):
+                chunk = thread_pks[start : start + RULES_CHUNK_SIZE]
+                rule_hits_run, rule_results = _run_rules_for_threads(
+                    conn, run_id, chunk, rules_config, rules, geo_config_hash
+                )
+                set_run_thread_results(conn, run_id, rule_results)
+                totals["rule_hits"] += rule_hits_run
+                checkpoint("rules", thread_pk=chunk[-1])
+        stage_seconds["rules"] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        genai_call = None
+        api_key = None
+        if args.offline_genai:
+            genai_call = partial(call_genai_offline, latency_seconds=args.genai_latency)
+        elif not config.get("OPENAI_API_KEY"):
             error_messages.append("Missing OPENAI_API_KEY; GenAI skipped.")
         else:
-            genai_calls, threads_flagged = _run_genai_for_threads(
-                conn,
-                run_id,
-                ingested_thread_pks,
-                rules_config,
-                genai_config,
-                config.get("OPENAI_API_KEY"),
-                rule_results,
-            )
+            genai_call = call_genai
+            api_key = config.get("OPENAI_API_KEY")
+        if genai_call is not None:
+            after_thread_pk = resume_thread_pk if resume_stage == "genai" else None
+            checkpoint("genai", thread_pk=after_thread_pk)
+            thread_pks = list_run_thread_pks(conn, run_id, after_thread_pk)
+            # GenAI calls are slow, so commit often to keep the write lock short.
+            for start in range(0, len(thread_pks), GENAI_CHUNK_SIZE):
+                chunk = thread_pks[start : start + GENAI_CHUNK_SIZE]
+                genai_calls, threads_flagged = _run_genai_for_threads(
+                    conn,
+                    run_id,
+                    chunk,
+                    rules_config,
+                    genai_config,
+                    api_key,
+                    get_run_thread_results(conn, run_id, chunk),
+                    genai_call=genai_call,
+                )
+                totals["genai_calls"] += genai_calls
+                totals["threads_flagged"] += threads_flagged
+                checkpoint("genai", thread_pk=chunk[-1])
+        stage_seconds["genai"] = time.perf_counter() - stage_start
 
         status = "partial" if error_messages else "success"
+        save_run_checkpoint(conn, run_id, "done", totals, int(time.time()))
         conn.execute(
             """
             UPDATE runs
             SET ended_at_utc = ?,
                 status = ?,
-                threads_fetched = ?,
-                comments_fetched = ?,
-                threads_new = ?,
-                threads_updated = ?,
-                rule_hits = ?,
-                genai_calls = ?,
-                threads_flagged = ?
+                fetch_seconds = ?,
+                throttle_seconds = ?,
+                error_summary = ?
             WHERE run_id = ?
             """,
             (
                 int(time.time()),
                 status,
-                threads_fetched,
-                comments_fetched,
-                threads_new,
-                threads_updated,
-                rule_hits_total,
-                genai_calls,
-                threads_flagged,
+                round(previous_seconds["fetch_seconds"] + fetch_timer.seconds, 3),
+                round(
+                    previous_seconds["throttle_seconds"]
+                    + (rate_limiter.throttle_seconds if rate_limiter else 0),
+                    3,
+                ),
+                " ".join(error_messages) or None,
                 run_id,
             ),
         )
-        if error_messages:
-            conn.execute(
-                """
-                UPDATE runs
-                SET error_summary = ?
-                WHERE run_id = ?
-                """,
-                (" ".join(error_messages), run_id),
-            )
         conn.commit()
     except Exception as exc:
+        # Drop the unfinished chunk; everything up to the checkpoint is kept.
+        conn.rollback()
         conn.execute(
             """
             UPDATE runs
@@ -633,16 +1123,23 @@ def main():
         )
         conn.commit()
         print(f"Ingestion failed: {exc}")
+        print(f"Resume with --resume {run_id}.")
         return 1
     finally:
-        conn.close()
+        if args.record and reddit is not None:
+            reddit.close()
+        close_connection()
 
     if subreddits == ["Atlanta"]:
         print("Using placeholder subreddits list: ['Atlanta'].")
 
-    print("Ingestion complete.")
+    elapsed = time.perf_counter() - timer_start
+    print(
+        f"Ingestion complete in {elapsed:.1f}s ("
+        + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in stage_seconds.items())
+        + f"; {totals['threads_fetched'] / max(elapsed, 1e-6):.1f} threads/s)."
+    )
     return 0
 
-
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -8,16 +8,19 @@ if APP_ROOT not in sys.path:
     sys.path.insert(0, APP_ROOT)
 
 from repo.config import upsert_config_value
-from repo.db import connect
+from repo.db import close_connection, get_connection
 from repo.migrate import init_db_if_missing
 
 
 def main():
     init_db_if_missing()
-    conn = connect()
+    conn = get_connection()
     try:
         defaults = {
             "subreddits": ["Atlanta"],
+            "fetch_workers": 4,
+            "comment_workers": 4,
+            "max_throttle_seconds": 300,
             "keywords_include": [],
             "keywords_intent": [],
             "keywords_negative": [],
@@ -32,7 +35,7 @@ def main():
             upsert_config_value(conn, key, value)
         conn.commit()
     finally:
-        conn.close()
+        close_connection()
 
     print("Seeded config defaults.")
     return 0
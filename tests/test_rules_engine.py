@@ -0,0 +1,23 @@
+import os
+import sys
+
+APP_ROOT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "app")
+if APP_ROOT not in sys.path:
+    sys.path.insert(0, APP_ROOT)
+
+from services.rules_engine import compile_rules, evaluate_comment
+
+
+def test_phrase_without_words_is_dropped():
+    config = {
+        "keywords_include": ["plumber"],
+        "keywords_intent": ["phrase:~2", "phrase:need ~1 plumber"],
+    }
+    compile_rules(config)
+    hits = evaluate_comment(
+        {"comment_pk": 1, "body": "Need a plumber today"}, config
+    )
+    assert sorted(hit["matched_term"] for hit in hits) == [
+        "phrase:need ~1 plumber",
+        "plumber",
+    ]